@@ -0,0 +1,225 @@
+import json
+import math
+import random
+import threading
+import time
+
+from java.lang import Runtime
+from java.util.concurrent import Callable, Executors
+
+# Whether the run on the current thread is one of several runs of run_parallel()
+# going on at the same time, see in_parallel_run().
+_thread_state = threading.local()
+
+
+class TimedRun(Callable):
+    ''' A task of the thread pool that returns how many seconds run() took.'''
+
+    def __init__(self, run, parallel):
+        self.run = run
+        self.parallel = parallel
+
+    def call(self):
+        _thread_state.parallel = self.parallel
+        try:
+            start_time = time.time()
+            self.run()
+            return time.time() - start_time
+        finally:
+            _thread_state.parallel = False
+
+
+def run_parallel(run, iterations, workers=1, warmup=1):
+    '''
+    Time iterations runs of a function, spread over a pool of worker threads.
+    The warm-up runs are done first, one at a time and untimed, so that the
+    Java Virtual Machine compiles the code before the timed runs start.
+
+    With more than one worker, the runs share the cores of the machine, so
+    each run takes longer than it would alone: the durations then measure the
+    throughput of the model rather than the latency of a single run.
+
+    Parameters:
+        run: function := Must be safe to call from several threads at once,
+                         e.g. it must not draw on the canvas.
+        iterations: int
+        workers: int := Number of worker threads. 0 uses one per core.
+        warmup: int := Number of runs done before the timed runs.
+
+    Return Value:
+        durations: list[float] := Seconds taken by each timed run.
+    '''
+    workers = worker_count(workers)
+    for _ in range(warmup):
+        TimedRun(run, workers > 1).call()
+
+    pool = Executors.newFixedThreadPool(workers)
+    try:
+        futures = pool.invokeAll([TimedRun(run, workers > 1) for _ in range(iterations)])
+        return [future.get() for future in futures]
+    finally:
+        pool.shutdown()
+
+
+def in_parallel_run():
+    ''' 
+    Returns True if the current thread is running one of several runs of
+    run_parallel() that go on at the same time. The cores are then already
+    busy, so such a run should not start threads of its own.
+    '''
+    return getattr(_thread_state, 'parallel', False)
+
+
+def run_benchmark(name, run, ModelConst, result_file_name):
+    '''
+    Benchmark a model with run_parallel() and print its runtimes. The runtimes
+    are saved as result_file_name and, if the benchmark_baseline parameter is
+    set, compared with the runtimes saved by an earlier benchmark.
+
+    Parameters:
+        name: str := Describes what was benchmarked, e.g. 'GBIPG on hand.png'.
+        run: function := See run_parallel().
+        ModelConst: GBIPG_CONST | MC_CONST
+        result_file_name: str
+
+    Return Value:
+        result: BenchmarkResult
+    '''
+    # The baseline is loaded before the result is saved, as it may be the result
+    # file of an earlier run, e.g. to compare the runtimes before and after a change.
+    baseline = None
+    if ModelConst.BENCHMARK_BASELINE:
+        baseline = load_result(sketchPath(ModelConst.BENCHMARK_BASELINE))
+
+    workers = worker_count(ModelConst.BENCHMARK_WORKERS)
+    print('Running {} iterations on {} worker threads after {} warm-up runs.'.format(
+        ModelConst.BENCHMARK_ITERATIONS, workers, ModelConst.BENCHMARK_WARMUP))
+    if workers > 1:
+        print('Note: the iterations run at the same time, so the runtimes measure throughput, not latency.')
+
+    durations = run_parallel(run, ModelConst.BENCHMARK_ITERATIONS, workers, ModelConst.BENCHMARK_WARMUP)
+    for i, duration in enumerate(durations):
+        print('Iteration {} of {}: {} seconds.'.format(i + 1, len(durations), round(duration, 3)))
+
+    result = BenchmarkResult(name, workers, durations)
+    print(result.summary())
+
+    result.save(savePath(result_file_name))
+    print('Saved runtimes to {}.'.format(result_file_name))
+
+    if baseline is not None:
+        print(result.compare(baseline))
+        if baseline.workers != workers:
+            print('Note: the baseline was run on {} worker threads, so the runtimes may not be comparable.'.format(
+                baseline.workers))
+
+    return result
+
+
+def worker_count(workers):
+    ''' Return the number of worker threads to use, one per core if workers is 0.'''
+    if workers <= 0:
+        return Runtime.getRuntime().availableProcessors()
+
+    return workers
+
+
+def median(values):
+    return percentile(values, 50)
+
+
+def percentile(values, p):
+    ''' Return the p-th percentile of values, interpolating between ranks.'''
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def bootstrap_ci(samples, statistic, resamples=2000, confidence=0.95, seed=0):
+    '''
+    Estimate a confidence interval of a statistic with the percentile
+    bootstrap: the statistic is computed on many resamples (drawn with
+    replacement) of the samples.
+
+    Parameters:
+        samples: list[list[float]] := One or more lists of values. Each list
+                                      is resampled on its own.
+        statistic: function := Takes one resample per list of samples.
+        resamples: int
+        confidence: float
+        seed: int := Seed of the resampling, so the interval is repeatable.
+
+    Return Value:
+        (low, high): tuple[float, float]
+    '''
+    rng = random.Random(seed)
+    estimates = []
+    for _ in range(resamples):
+        resampled = [[rng.choice(values) for _ in values] for values in samples]
+        estimates.append(statistic(*resampled))
+
+    tail = (1.0 - confidence) / 2 * 100
+    return (percentile(estimates, tail), percentile(estimates, 100 - tail))
+
+
+class BenchmarkResult:
+    '''
+    Runtimes of a benchmark, which can be saved and later compared with the
+    runtimes of another benchmark.
+
+    Attributes:
+        name: str
+        workers: int
+        durations: list[float]
+    '''
+
+    def __init__(self, name, workers, durations):
+        self.name = name
+        self.workers = workers
+        self.durations = durations
+
+    def summary(self):
+        low, high = bootstrap_ci([self.durations], median)
+        mean = sum(self.durations) / len(self.durations)
+        variance = sum([(d - mean)**2 for d in self.durations]) / len(self.durations)
+        return '\n'.join([
+            'Median runtime: {:.3f} seconds (95% CI: {:.3f} to {:.3f})'.format(median(self.durations), low, high),
+            '95th percentile runtime: {:.3f} seconds'.format(percentile(self.durations, 95)),
+            'Average runtime: {:.3f} seconds'.format(mean),
+            'Variance: {:.5f}'.format(variance),
+        ])
+
+    def compare(self, baseline):
+        '''
+        Return how many times faster this benchmark is than baseline, as the
+        ratio of the median runtimes, with its 95% confidence interval. The
+        speedup is significant if the interval does not contain 1.
+        '''
+        speedup = lambda base, current: median(base) / median(current)
+        low, high = bootstrap_ci([baseline.durations, self.durations], speedup)
+        ratio = speedup(baseline.durations, self.durations)
+
+        if low > 1:
+            verdict = 'significantly faster'
+        elif high < 1:
+            verdict = 'significantly slower'
+        else:
+            verdict = 'no significant difference'
+
+        return 'Speedup over {}: {:.2f}x (95% CI: {:.2f}x to {:.2f}x), {}.'.format(
+            baseline.name, ratio, low, high, verdict)
+
+    def save(self, path):
+        out = open(path, 'w')
+        json.dump({'name': self.name, 'workers': self.workers, 'durations': self.durations}, out)
+        out.close()
+
+
+def load_result(path):
+    ''' Load a BenchmarkResult saved with BenchmarkResult.save().'''
+    result_file = open(path)
+    result = json.load(result_file)
+    result_file.close()
+    return BenchmarkResult(result['name'], result['workers'], result['durations'])
@@ -1,4 +1,6 @@
+import bisect
 import random as rand
+from array import array
 
 from const import GBIPG_CONST
 import const
@@ -15,7 +17,11 @@ class Point:
         self._y = y
         self._ModelConst = ModelConst
         self._loc = self._ModelConst.WIDTH*self._y + self._x
-        self._in_fig = (canvas_pxls[self.get_loc()] == const.BLACK_RGB)
+
+        # Pixels of other colors are counted as background, like mask.MaskPyramid.region_at().
+        self._code = ModelConst.mask_code(canvas_pxls[self.get_loc()])
+        if self._code == const.MASK_OTHER_CODE:
+            self._code = const.MASK_BG_CODE
 
     def get_loc(self):
         return self._loc
@@ -31,26 +37,20 @@ class Point:
         self._set_loc()
 
     def in_fig(self):
-        return self._in_fig
-
-    def will_overlap_point(self, p2):
-        p_coord = self.get_coord()
-        p2_coord = p2.get_coord()
-        return utils.distance_squared(p_coord, p2_coord) <= (2 * self._ModelConst.MIN_CIRCLE_RADIUS)**2
+        ''' Returns True if the point is in the figure or in an extra figure region.'''
+        return self._code != const.MASK_BG_CODE
 
-    def will_overlap_wall(self):
-        px, py = self.get_coord()
+    def mask_code(self):
+        return self._code
 
-        if utils.distance_squared((px, py), (self._ModelConst.WIDTH/2, self._ModelConst.HEIGHT/2)) > self._ModelConst.WALL_RADIUS**2:
-            return True
+    def will_overlap_wall(self, plate, r=0):
+        if r == 0:
+            return not plate.contains(self._x, self._y)
 
-        return False
+        return plate.wall_distance(self._x, self._y) < r
 
-    def will_overlap_fig_boundary(self, canvas_pxls):
-        return utils.opposite_colr_point_in_circle(self, self._ModelConst.MIN_CIRCLE_RADIUS, canvas_pxls, self._ModelConst)
-
-    def will_overlap_something(self, r, canvas_pxls):
-        return utils.other_colr_point_in_circle(self, r, canvas_pxls, self._ModelConst)
+    def will_overlap_fig_boundary(self, mask):
+        return mask.opposite_in_circle(self._x, self._y, self.mask_code(), self._ModelConst.MIN_CIRCLE_RADIUS)
 
 
 class Node():
@@ -60,7 +60,6 @@ class Node():
         center: Point
         radius: int := Initially set to MIN_CIRCLE_RADIUS.
         max_radius: int := Initially set to MIN_CIRCLE_RADIUS.
-        adj_nodes: list[int] := list of index (in CirclesAdjacencyGraph) of nodes adjacent to this node.
     '''
 
     def __init__(self, Id, center, ModelConst):
@@ -68,84 +67,205 @@ class Node():
         self.center = center
         self.radius = GBIPG_CONST.MIN_CIRCLE_RADIUS
         self.max_radius = GBIPG_CONST.MIN_CIRCLE_RADIUS
-        self.adj_nodes = []
         self._ModelConst = ModelConst
 
-    def build_adj_nodes(self, indx, node_list, canvas_pxls):
-        ''' 
-        Get all adjacent nodes of this node and adjust max_radius 
-        accordingly.
-
-        Parameters:
-            indx: int := Index of this node in the node_list.
-            node_list: list[Node]
-            canvas_pxls: list[color]
-
-        Return Value:
-            None
-        '''
-        max_radius = max(self.max_radius, self._nearest_wall_distance())
-
-        adj_nodes = []
-        for i, node in enumerate(node_list):
-            if i != indx:
-                distance = self._other_node_distance(node)
-                if distance < max_radius:
-                    max_radius = distance
-                    adj_nodes = [i]
-                elif distance == max_radius:
-                    adj_nodes.append(i)
-
-        self.max_radius = max_radius
-        new_max_radius = utils.nearest_other_colored_pixel(self, canvas_pxls)
-        
-        if new_max_radius < self.max_radius:
-            self.max_radius = new_max_radius
-            adj_nodes = []
-
-        for index in adj_nodes:
-            if index not in self.adj_nodes:
-                self.adj_nodes.append(index)
-                if indx not in node_list[index].adj_nodes:
-                    node_list[index].adj_nodes.append(indx)
-
-    def _nearest_wall_distance(self):
-        cx, cy = self.center.get_coord()
-        midx, midy = GBIPG_CONST.WIDTH/2, GBIPG_CONST.HEIGHT/2
-        return GBIPG_CONST.WALL_RADIUS - utils.distance((cx, cy), (midx, midy))
-
-    def _other_node_distance(self, n2):
-        c1 = self.center.get_coord()
-        c2 = n2.center.get_coord()
-        return utils.distance(c1, c2) - GBIPG_CONST.MIN_CIRCLE_RADIUS
-
 
 class CirclesAdjacencyGraph:
     ''' 
     A graph with nodes representing the circles of the Ishihara Plate. Two nodes are adjacent with
     each other when at least one of them has their max_radius bounded by the other node.
 
+    The graph is built without comparing every pair of nodes, so that it can hold millions of
+    nodes: the nodes are sorted by the Morton code (Z-order) of the cell of a grid that they
+    are in, so each node only visits the nodes in the cells around it, found by binary search.
+    The edges are kept in flat integer arrays in compressed sparse row form instead of a list
+    per node.
+
     Attributes:
         nodes: list[Node]
+        adj_offsets: array[int] := The nodes adjacent to nodes[i] are at adj_offsets[i] up to
+                                   adj_offsets[i + 1] of adj_targets (see adjacent()).
+        adj_targets: array[int]
     '''
 
-    def __init__(self, center_points, canvas_pxls, ModelConst):
-        self.nodes = self._get_nodes(center_points, ModelConst)
-        for i in range(len(self.nodes)):
-            self.nodes[i].build_adj_nodes(i, self.nodes, canvas_pxls)
+    def __init__(self, center_points, mask, plate, ModelConst):
+        nodes = self._get_nodes(center_points, ModelConst)
+        max_radii, edge_sources, edge_targets = self._find_nearest_nodes(nodes, mask, plate)
+        offsets, targets = self._get_symmetric_edges(len(nodes), edge_sources, edge_targets)
 
         # Add heuristics. Re-order nodes by how largest max_radius first then 
         # most adjacent nodes for tie-breaker.
-        self.nodes.sort(key= lambda x: (-x.max_radius, -len(x.adj_nodes)))
+        order = sorted(range(len(nodes)), key=lambda i: (-max_radii[i], offsets[i] - offsets[i + 1]))
+
+        new_position = array('i', [0]) * len(nodes) # Maps the old position of a node to its new position.
+        for i, old_pos in enumerate(order):
+            new_position[old_pos] = i
+
+        self.nodes = []
+        self.adj_offsets = array('i', [0])
+        self.adj_targets = array('i')
+        for old_pos in order:
+            node = nodes[old_pos]
+            node.max_radius = max_radii[old_pos]
+            self.nodes.append(node)
+            for k in range(offsets[old_pos], offsets[old_pos + 1]):
+                self.adj_targets.append(new_position[targets[k]])
+            self.adj_offsets.append(len(self.adj_targets))
+
+    def adjacent(self, indx):
+        ''' Return the index of every node adjacent to the node at indx.'''
+        return self.adj_targets[self.adj_offsets[indx]:self.adj_offsets[indx + 1]]
+
+    def _find_nearest_nodes(self, nodes, mask, plate):
+        '''
+        Find the max_radius of each node, i.e. the distance to the nearest other node (less
+        MIN_CIRCLE_RADIUS), to the wall or to the figure boundary, whichever is nearest. The
+        nearest other nodes become adjacent to the node, unless the wall or the figure boundary
+        is nearer.
+
+        Return Value:
+            (max_radii, edge_sources, edge_targets): tuple[array[float], array[int], array[int]]
+        '''
+        min_radius = GBIPG_CONST.MIN_CIRCLE_RADIUS
+
+        # A node's max_radius is at most the larger of min_radius and max_dist, so its nearest
+        # other nodes are in the cells around it.
+        cell_size = int(max(min_radius, plate.max_dist) + min_radius) + 1
+        order, cell_codes = self._get_morton_order(nodes, cell_size)
+
+        max_radii = array('d', [0.0]) * len(nodes)
+        edge_sources = array('i')
+        edge_targets = array('i')
+
+        for i in order:
+            cx, cy = nodes[i].center.get_coord()
+            max_radius = max(min_radius, plate.wall_distance(cx, cy))
+            nearest = []
+
+            cell_x, cell_y = cx // cell_size, cy // cell_size
+            for neighbour_x in range(max(0, cell_x - 1), cell_x + 2):
+                for neighbour_y in range(max(0, cell_y - 1), cell_y + 2):
+                    code = utils.morton_code(neighbour_x, neighbour_y)
+                    k = bisect.bisect_left(cell_codes, code)
+                    while k < len(cell_codes) and cell_codes[k] == code:
+                        j = order[k]
+                        k += 1
+                        if j == i:
+                            continue
+
+                        distance = utils.distance((cx, cy), nodes[j].center.get_coord()) - min_radius
+                        if distance < max_radius:
+                            max_radius = distance
+                            nearest = [j]
+                        elif distance == max_radius:
+                            nearest.append(j)
+
+            new_max_radius = mask.nearest_opposite_distance(cx, cy, nodes[i].center.mask_code(), max_radius)
+            if new_max_radius < max_radius:
+                max_radius = new_max_radius
+                nearest = []
+
+            max_radii[i] = max_radius
+            for j in nearest:
+                edge_sources.append(i)
+                edge_targets.append(j)
+
+        return (max_radii, edge_sources, edge_targets)
+
+    def _get_morton_order(self, nodes, cell_size):
+        '''
+        Return the index of the nodes sorted by the Morton code of their cell, and the sorted
+        Morton codes.
+
+        Return Value:
+            (order, cell_codes): tuple[list[int], array[int]]
+        '''
+        codes = array('l')
+        for node in nodes:
+            cx, cy = node.center.get_coord()
+            codes.append(utils.morton_code(cx // cell_size, cy // cell_size))
+
+        order = sorted(range(len(nodes)), key=codes.__getitem__)
+        cell_codes = array('l', [codes[i] for i in order])
+        return (order, cell_codes)
+
+    def _get_symmetric_edges(self, node_count, edge_sources, edge_targets):
+        '''
+        Turn the edges from each node to its nearest nodes into undirected edges in
+        compressed sparse row form, without duplicates.
+
+        Return Value:
+            (offsets, targets): tuple[array[int], array[int]]
+        '''
+        degrees = array('i', [0]) * node_count
+        for k in range(len(edge_sources)):
+            degrees[edge_sources[k]] += 1
+            degrees[edge_targets[k]] += 1
+
+        offsets = array('i', [0]) * (node_count + 1)
+        for i in range(node_count):
+            offsets[i + 1] = offsets[i] + degrees[i]
+
+        # Fill each node's row, then close the gaps left by the duplicates.
+        ends = array('i', offsets[:-1])
+        targets = array('i', [0]) * offsets[-1]
+        for k in range(len(edge_sources)):
+            for a, b in [(edge_sources[k], edge_targets[k]), (edge_targets[k], edge_sources[k])]:
+                if b not in targets[offsets[a]:ends[a]]:
+                    targets[ends[a]] = b
+                    ends[a] += 1
+
+        compact_offsets = array('i', [0])
+        compact_targets = array('i')
+        for i in range(node_count):
+            compact_targets.extend(targets[offsets[i]:ends[i]])
+            compact_offsets.append(len(compact_targets))
+
+        return (compact_offsets, compact_targets)
+
+    def get_conflict_edges(self, max_radii, cell_size):
+        ''' 
+        Return every pair of nodes whose circles could overlap, i.e. whose
+        centers are closer than the sum of their max_radii. The pairs are
+        returned as arrays in compressed sparse row form: the nodes paired with
+        node i, and the distances between them, are at offsets[i] up to
+        offsets[i + 1] of targets and distances. Only pairs (i, j) with i < j
+        are returned.
+
+        Parameters:
+            max_radii: list[float] := Upper bound of each node's radius. Must
+                                      not be larger than cell_size / 2.
+            cell_size: int
 
-        id_mapping = {} # Maps the old position of a node in nodes to its new position.
-        for i in range(len(self.nodes)):
-            id_mapping[self.nodes[i].id] = i
-        
-        for i in range(len(self.nodes)):
-            for j in range(len(self.nodes[i].adj_nodes)):
-                old_pos = self.nodes[i].adj_nodes[j]
-                self.nodes[i].adj_nodes[j] = id_mapping[old_pos]
+        Return Value:
+            (offsets, targets, distances): tuple[array[int], array[int], array[float]]
+        '''
+        cells = {}
+        for i, node in enumerate(self.nodes):
+            cx, cy = node.center.get_coord()
+            cells.setdefault((cx // cell_size, cy // cell_size), []).append(i)
+
+        offsets = array('i', [0])
+        targets = array('i')
+        distances = array('d')
+
+        for i, node in enumerate(self.nodes):
+            cx, cy = node.center.get_coord()
+            cell_x, cell_y = cx // cell_size, cy // cell_size
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j in cells.get((cell_x + dx, cell_y + dy), []):
+                        if j <= i:
+                            continue
+
+                        d = utils.distance((cx, cy), self.nodes[j].center.get_coord())
+                        if d < max_radii[i] + max_radii[j]:
+                            targets.append(j)
+                            distances.append(d)
+
+            offsets.append(len(targets))
+
+        return (offsets, targets, distances)
 
     def _get_nodes(self, center_points, ModelConst):
         nodes = []
@@ -153,3 +273,79 @@ class CirclesAdjacencyGraph:
             nodes.append(Node(i, p, ModelConst))
 
         return nodes
+
+
+class CircleGrid:
+    ''' 
+    Spatial hash of the circles already placed on the plate. Each circle is
+    stored in the square cell (of side cell_size) that contains its center, so
+    only the cells around a point need to be visited to find the circles near
+    it.
+
+    Attributes:
+        cell_size: int
+        circles: list[tuple[float, float, float]] := (x, y, r) of each circle.
+        max_radius: float := Largest radius among the circles.
+    '''
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.circles = []
+        self.max_radius = 0
+        self._cells = {}
+
+    def add(self, x, y, r):
+        ''' Add the circle and return its index in circles.'''
+        indx = len(self.circles)
+        self.circles.append((x, y, r))
+        self._cells.setdefault(self._get_cell(x, y), []).append(indx)
+        self.max_radius = max(self.max_radius, r)
+        return indx
+
+    def query(self, x, y, reach):
+        ''' 
+        Return the index of every circle whose center is at most
+        reach + max_radius away from (x, y), plus possibly a few farther ones.
+        '''
+        reach += self.max_radius
+        x_start, y_start = self._get_cell(x - reach, y - reach)
+        x_end, y_end = self._get_cell(x + reach, y + reach)
+
+        indices = []
+        for cx in range(x_start, x_end + 1):
+            for cy in range(y_start, y_end + 1):
+                indices.extend(self._cells.get((cx, cy), []))
+
+        return indices
+
+    def clearance(self, x, y, limit):
+        ''' 
+        Return the distance between (x, y) and the nearest circle's edge, or
+        limit if every circle is farther than that. The distance is negative
+        when (x, y) lies inside a circle.
+        '''
+        for indx in self.query(x, y, limit):
+            cx, cy, r = self.circles[indx]
+            limit = min(limit, utils.distance((x, y), (cx, cy)) - r)
+
+        return limit
+
+    def neighbours(self, indx, gap):
+        ''' 
+        Return the index of every other circle whose edge is less than gap
+        away from the edge of the circle at indx.
+        '''
+        x, y, r = self.circles[indx]
+        neighbours = []
+        for indx2 in self.query(x, y, r + gap):
+            if indx2 == indx:
+                continue
+
+            x2, y2, r2 = self.circles[indx2]
+            if utils.distance((x, y), (x2, y2)) - r - r2 < gap:
+                neighbours.append(indx2)
+
+        return neighbours
+
+    def _get_cell(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
@@ -10,27 +10,109 @@ WHITE_RGB = color(255, 255, 255)
 
 GRAYSCALE_THRESHOLD = 127
 
+# Largest difference, summed over the red, green and blue channels, between
+# the color of a pixel and the mask_color of an extra figure region for the
+# pixel to be taken as part of the region when the input image is
+# preprocessed, e.g. a pixel that resizing the image blended with its neighbours.
+REGION_COLOR_TOLERANCE = 96
+
+# Codes used by mask.MaskPyramid to label the pixels/cells of the input image.
+MASK_BG_CODE = 0
+MASK_FIG_CODE = 1
+MASK_OTHER_CODE = 254
+MASK_MIXED_CODE = 255
+
+# Mask code of the first extra figure region (see the regions parameter). The
+# i-th region has the code MASK_REGION_CODE_START + i.
+MASK_REGION_CODE_START = 2
+MAX_REGIONS = MASK_OTHER_CODE - MASK_REGION_CODE_START
+
+# Cell size (in pixels) of the coarsest level of mask.MaskPyramid.
+MASK_PYRAMID_TOP_CELL_SIZE = 64
+
+# Cell size (in pixels) of the boundary band of mask.MaskPyramid. Must be a
+# power of 2 that is at most MASK_PYRAMID_TOP_CELL_SIZE.
+MASK_BAND_CELL_SIZE = 8
+
+# Number of cells of a row of mask.MaskPyramid that are built at once if
+# their pixels all agree.
+MASK_LEVEL_CHUNK_SIZE = 32
+
+# Radius of the circle used by plate.Plate to approximate a straight piece of
+# an outline's wall.
+PLATE_TANGENT_CIRCLE_RADIUS = 10000.0
+
+# Number of levels of coarseness that the random points of GBIPG can be thinned
+# to when solving all of them would miss the deadline (see deadline.Deadline).
+DEADLINE_SEED_LEVELS = 3
+
+# Number of circles that the Monte Carlo algorithm draws at a time if it has a
+# deadline, so that it knows how long drawing the rest of its circles takes.
+DEADLINE_DRAW_BATCH_SIZE = 500
+
 RED_COLOR_SCHEME = ['#ff0000']
 GRAYSCALE_COLOR_SCHEME = ['#b4b4b4', '#646464', '#d4d4d4', '#4c4c4c']
 
 
 class ModelConst:
-    def __init__(self, mode, benchmark_iterations, file_name, preprocess_img,
-                 width, height, wall_radius, max_filled_area_ratio,
+    # Values of the mode parameter that the model supports.
+    MODES = ['normal', 'benchmark', 'convert', 'headless']
+
+    # Phases of the model that get a slice of the deadline (see deadline.Deadline).
+    PHASES = ['setup', 'circles']
+
+    # Extra figure regions of the input image, and the mask code of the color
+    # of each region's pixels. Only GBIPG supports them.
+    REGIONS = []
+    REGION_CODES = {}
+
+    def __init__(self, mode, benchmark_iterations, benchmark_workers,
+                 benchmark_warmup, benchmark_baseline, file_name, preprocess_img,
+                 width, height, wall_radius, outline, max_filled_area_ratio,
                  min_circle_radius, max_circle_radius, fig_color_scheme,
-                 bg_color_scheme):
+                 bg_color_scheme, luminance_jitter, min_acceptance_rate,
+                 min_fill_rate, convergence_window, save_convergence,
+                 profile_enabled, profile_interval, profile_format,
+                 deadline_enabled, deadline_seconds, deadline_slices):
         self.MODE = mode
         self.BENCHMARK_ITERATIONS = benchmark_iterations
+        self.BENCHMARK_WORKERS = benchmark_workers
+        self.BENCHMARK_WARMUP = benchmark_warmup
+        self.BENCHMARK_BASELINE = benchmark_baseline
         self.FILE_NAME = file_name
         self.PREPROCESS_IMG = preprocess_img
         self.WIDTH = width
         self.HEIGHT = height
         self.WALL_RADIUS = wall_radius
+        self.OUTLINE = outline
         self.MAX_FILLED_AREA_RATIO = max_filled_area_ratio
         self.MIN_CIRCLE_RADIUS = min_circle_radius
         self.MAX_CIRCLE_RADIUS = max_circle_radius
         self.FIG_COLOR_SCHEME = fig_color_scheme
         self.BG_COLOR_SCHEME = bg_color_scheme
+        self.LUMINANCE_JITTER = luminance_jitter
+        self.MIN_ACCEPTANCE_RATE = min_acceptance_rate
+        self.MIN_FILL_RATE = min_fill_rate
+        self.CONVERGENCE_WINDOW = convergence_window
+        self.SAVE_CONVERGENCE = save_convergence
+        self.PROFILE_ENABLED = profile_enabled
+        self.PROFILE_INTERVAL = profile_interval
+        self.PROFILE_FORMAT = profile_format
+        self.DEADLINE_ENABLED = deadline_enabled
+        self.DEADLINE_SECONDS = deadline_seconds
+        self.DEADLINE_SLICES = deadline_slices
+
+    def mask_code(self, colr):
+        ''' Return the mask code (see mask.MaskPyramid) of a pixel of the input image.'''
+        if colr == WHITE_RGB:
+            return MASK_BG_CODE
+        if colr == BLACK_RGB:
+            return MASK_FIG_CODE
+        return self.REGION_CODES.get(colr, MASK_OTHER_CODE)
+
+    def figure_codes(self):
+        ''' Return the mask code of the figure and of each extra figure region.'''
+        return [MASK_FIG_CODE] + [MASK_REGION_CODE_START + i for i in range(len(self.REGIONS))]
 
     def is_parameters_valid(self):
         positive_int_parameters = {
@@ -40,6 +122,7 @@ class ModelConst:
             self.WALL_RADIUS: 'wall_radius',
             self.MIN_CIRCLE_RADIUS: 'minimum_circle_radius',
             self.MAX_CIRCLE_RADIUS: 'maximum_circle_radius',
+            self.CONVERGENCE_WINDOW: 'convergence.window',
         }
 
         for param in positive_int_parameters:
@@ -48,8 +131,18 @@ class ModelConst:
                     positive_int_parameters[param]))
                 return False
 
-        if self.MODE not in ['normal', 'benchmark']:
-            print("Error: Invalid mode parameter value. Must be 'normal' or 'benchmark'.")
+        if self.MODE not in self.MODES:
+            print("Error: Invalid mode parameter value. Must be {} or '{}'.".format(
+                ', '.join(["'{}'".format(mode) for mode in self.MODES[:-1]]), self.MODES[-1]))
+            return False
+
+        for param, name in [(self.BENCHMARK_WORKERS, 'benchmark_workers'), (self.BENCHMARK_WARMUP, 'benchmark_warmup')]:
+            if type(param) != int or param < 0:
+                print("Error: Invalid {} parameter value. Must be a non-negative integer.".format(name))
+                return False
+
+        if self.BENCHMARK_BASELINE and not self.BENCHMARK_BASELINE.endswith('.json'):
+            print("Error: Supplied benchmark_baseline is not a benchmark result (JSON) file.")
             return False
 
         if type(self.PREPROCESS_IMG) != bool:
@@ -57,19 +150,23 @@ class ModelConst:
                 "Error: Invalid preprocess_img parameter value type. Must be a boolean type.")
             return False
 
-        if not self.FILE_NAME.endswith('.png'):
-            print("Error: Supplied image is not in PNG format.")
+        if not self.FILE_NAME.endswith('.png') and not self.FILE_NAME.endswith('.mask'):
+            print("Error: Supplied image is not in PNG or raw mask format.")
+            return False
+
+        if self.MODE == 'convert' and not self.FILE_NAME.endswith('.png'):
+            print("Error: Only a PNG image can be converted to a raw mask.")
             return False
 
-        if self.WIDTH != self.HEIGHT:
-            print("Error: Canvas' width and height parameters are not equal.")
+        if self.OUTLINE and not self.OUTLINE.endswith('.png'):
+            print("Error: Supplied plate outline image is not in PNG format.")
             return False
 
-        if self.WALL_RADIUS >= self.WIDTH / 2:
+        if not self.OUTLINE and self.WALL_RADIUS >= min(self.WIDTH, self.HEIGHT) / 2:
             print(
                 "Error: Canvas' wall_radius parameter is too large for the canvas' width/height parameter.")
             print(
-                "Make sure that it is less than half of the canvas' width/height parameter.")
+                "Make sure that it is less than half of the smaller of the canvas' width and height parameters.")
             return False
 
         if self.MIN_CIRCLE_RADIUS >= self.MAX_CIRCLE_RADIUS:
@@ -86,7 +183,74 @@ class ModelConst:
                 "Error: Invalid value for max_filled_area_ratio parameter. Should be between 0.0 and 1.0.")
             return False
 
-        for color_hex in self.BG_COLOR_SCHEME:
+        if self.MIN_ACCEPTANCE_RATE > 1.0 or self.MIN_ACCEPTANCE_RATE < 0.0:
+            print(
+                "Error: Invalid value for convergence.min_acceptance_rate parameter. Should be between 0.0 and 1.0.")
+            return False
+
+        if type(self.MIN_FILL_RATE) not in [int, float] or self.MIN_FILL_RATE < 0:
+            print(
+                "Error: Invalid convergence.min_fill_rate parameter value. Must be a non-negative number.")
+            return False
+
+        if type(self.SAVE_CONVERGENCE) != bool:
+            print(
+                "Error: Invalid convergence.save_curve parameter value type. Must be a boolean type.")
+            return False
+
+        if type(self.PROFILE_ENABLED) != bool:
+            print(
+                "Error: Invalid profile.enabled parameter value type. Must be a boolean type.")
+            return False
+
+        if type(self.PROFILE_INTERVAL) not in [int, float] or self.PROFILE_INTERVAL <= 0:
+            print(
+                "Error: Invalid profile.interval parameter value. Must be a positive number.")
+            return False
+
+        if self.PROFILE_FORMAT not in ['collapsed', 'speedscope']:
+            print("Error: Invalid profile.format parameter value. Must be 'collapsed' or 'speedscope'.")
+            return False
+
+        if type(self.DEADLINE_ENABLED) != bool:
+            print(
+                "Error: Invalid deadline.enabled parameter value type. Must be a boolean type.")
+            return False
+
+        if type(self.DEADLINE_SECONDS) not in [int, float] or self.DEADLINE_SECONDS <= 0:
+            print(
+                "Error: Invalid deadline.seconds parameter value. Must be a positive number.")
+            return False
+
+        if type(self.DEADLINE_SLICES) != dict or sorted(self.DEADLINE_SLICES) != sorted(self.PHASES):
+            print("Error: Invalid deadline.slices parameter value. Must give a slice to each of {}.".format(
+                ', '.join(["'{}'".format(phase) for phase in self.PHASES])))
+            return False
+
+        for budget_slice in self.DEADLINE_SLICES.values():
+            if type(budget_slice) not in [int, float] or budget_slice <= 0:
+                print(
+                    "Error: Invalid deadline.slices parameter value. Each slice must be a positive number.")
+                return False
+
+        if sum(self.DEADLINE_SLICES.values()) > 1.0 + 1e-9:
+            print(
+                "Error: Invalid deadline.slices parameter value. The slices must add up to at most 1.0.")
+            return False
+
+        if type(self.LUMINANCE_JITTER) not in [int, float] or self.LUMINANCE_JITTER > 1.0 or self.LUMINANCE_JITTER < 0.0:
+            print(
+                "Error: Invalid value for color_scheme.luminance_jitter parameter. Should be between 0.0 and 1.0.")
+            return False
+
+        for entry in self.BG_COLOR_SCHEME:
+            scheme_entry = utils.color_scheme_entry(entry)
+            if scheme_entry is None or scheme_entry[1] <= 0:
+                print(
+                    "Error: Invalid bg_color_scheme parameter value. Each color must be a color hex or a [color hex, weight] pair with a positive weight.")
+                return False
+
+            color_hex = scheme_entry[0]
             if not utils.is_color_hex(color_hex):
                 print(
                     "Error: Invalid bg_color_scheme parameter value. Must be of the form '#xxxxxx'.")
@@ -96,7 +260,14 @@ class ModelConst:
                 print(
                     "Error: Invalid bg_color_scheme parameter value. Cannot use black or white as background color.")
 
-        for color_hex in self.FIG_COLOR_SCHEME:
+        for entry in self.FIG_COLOR_SCHEME:
+            scheme_entry = utils.color_scheme_entry(entry)
+            if scheme_entry is None or scheme_entry[1] <= 0:
+                print(
+                    "Error: Invalid fig_color_scheme parameter value. Each color must be a color hex or a [color hex, weight] pair with a positive weight.")
+                return False
+
+            color_hex = scheme_entry[0]
             if not utils.is_color_hex(color_hex):
                 print(
                     "Error: Invalid fig_color_scheme parameter value. Must be of the form '#xxxxxx'.")
@@ -110,17 +281,48 @@ class ModelConst:
 
 
 class GBIPGConst(ModelConst):
-    def __init__(self, mode, benchmark_iterations, file_name, preprocess_img,
-                 width, height, wall_radius, max_filled_area_ratio,
+    MODES = ModelConst.MODES + ['verify']
+    PHASES = ['setup', 'seeds', 'graph', 'display', 'crevices']
+
+    def __init__(self, mode, benchmark_iterations, benchmark_workers,
+                 benchmark_warmup, benchmark_baseline, file_name, preprocess_img,
+                 width, height, wall_radius, outline, max_filled_area_ratio,
                  min_circle_radius, max_circle_radius, fig_color_scheme,
-                 bg_color_scheme, save_states, box_size):
+                 bg_color_scheme, luminance_jitter, min_acceptance_rate,
+                 min_fill_rate, convergence_window, save_convergence,
+                 profile_enabled, profile_interval, profile_format,
+                 deadline_enabled, deadline_seconds, deadline_slices, save_states,
+                 snapshot_interval, verify_time_budget, verify_time_budgets,
+                 library_enabled, library_directory, library_max_entries,
+                 library_max_distance, background_cache_enabled,
+                 background_cache_directory, box_size, regions):
         ModelConst.__init__(
-            self, mode, benchmark_iterations, file_name, preprocess_img, width,
-            height, wall_radius, max_filled_area_ratio, min_circle_radius,
-            max_circle_radius, fig_color_scheme, bg_color_scheme
+            self, mode, benchmark_iterations, benchmark_workers,
+            benchmark_warmup, benchmark_baseline, file_name, preprocess_img, width,
+            height, wall_radius, outline, max_filled_area_ratio, min_circle_radius,
+            max_circle_radius, fig_color_scheme, bg_color_scheme,
+            luminance_jitter, min_acceptance_rate, min_fill_rate,
+            convergence_window, save_convergence, profile_enabled,
+            profile_interval, profile_format, deadline_enabled,
+            deadline_seconds, deadline_slices
         )
         self.SAVE_STATES = save_states
+        self.SNAPSHOT_INTERVAL = snapshot_interval
+        self.VERIFY_TIME_BUDGET = verify_time_budget
+        self.VERIFY_TIME_BUDGETS = verify_time_budgets
+        self.LIBRARY_ENABLED = library_enabled
+        self.LIBRARY_DIRECTORY = library_directory
+        self.LIBRARY_MAX_ENTRIES = library_max_entries
+        self.LIBRARY_MAX_DISTANCE = library_max_distance
+        self.BACKGROUND_CACHE_ENABLED = background_cache_enabled
+        self.BACKGROUND_CACHE_DIRECTORY = background_cache_directory
         self.BOX_SIZE = box_size
+        self.REGIONS = regions
+        self.REGION_CODES = {}
+        for i, region in enumerate(regions):
+            # Invalid regions are reported by is_parameters_valid().
+            if type(region) == dict and utils.is_color_hex(region.get('mask_color', '')):
+                self.REGION_CODES[utils.hex_to_color(region['mask_color'])] = MASK_REGION_CODE_START + i
 
     def is_parameters_valid(self):
         if not ModelConst.is_parameters_valid(self):
@@ -131,6 +333,55 @@ class GBIPGConst(ModelConst):
                 "Error: Invalid save_states parameter value type. Must be a boolean type.")
             return False
 
+        if type(self.SNAPSHOT_INTERVAL) not in [int, float] or self.SNAPSHOT_INTERVAL < 0:
+            print(
+                "Error: Invalid snapshot_interval parameter value. Must be a non-negative number.")
+            return False
+
+        if type(self.VERIFY_TIME_BUDGET) not in [int, float] or self.VERIFY_TIME_BUDGET <= 0:
+            print(
+                "Error: Invalid verify.time_budget parameter value. Must be a positive number.")
+            return False
+
+        if type(self.VERIFY_TIME_BUDGETS) != dict:
+            print(
+                "Error: Invalid verify.time_budgets parameter value type. Must map image file names to budgets.")
+            return False
+
+        for budget in self.VERIFY_TIME_BUDGETS.values():
+            if type(budget) not in [int, float] or budget <= 0:
+                print(
+                    "Error: Invalid verify.time_budgets parameter value. Each budget must be a positive number.")
+                return False
+
+        if type(self.LIBRARY_ENABLED) != bool:
+            print(
+                "Error: Invalid library.enabled parameter value type. Must be a boolean type.")
+            return False
+
+        if self.LIBRARY_ENABLED and not self.LIBRARY_DIRECTORY:
+            print("Error: Invalid library.directory parameter value. Must not be empty.")
+            return False
+
+        if type(self.LIBRARY_MAX_ENTRIES) != int or self.LIBRARY_MAX_ENTRIES <= 0:
+            print(
+                "Error: Invalid library.max_entries parameter value. Must be a non-zero, positive integer.")
+            return False
+
+        if type(self.LIBRARY_MAX_DISTANCE) not in [int, float] or self.LIBRARY_MAX_DISTANCE > 1.0 or self.LIBRARY_MAX_DISTANCE < 0.0:
+            print(
+                "Error: Invalid value for library.max_distance parameter. Should be between 0.0 and 1.0.")
+            return False
+
+        if type(self.BACKGROUND_CACHE_ENABLED) != bool:
+            print(
+                "Error: Invalid background_cache.enabled parameter value type. Must be a boolean type.")
+            return False
+
+        if self.BACKGROUND_CACHE_ENABLED and not self.BACKGROUND_CACHE_DIRECTORY:
+            print("Error: Invalid background_cache.directory parameter value. Must not be empty.")
+            return False
+
         if self.BOX_SIZE >= self.WALL_RADIUS / 2:
             print("Error: box_size parameter is too large.")
             print("Make sure that it is less than half of the wall_radius parameter.")
@@ -141,18 +392,65 @@ class GBIPGConst(ModelConst):
                 "Error: min_circle_radius parameter is too large for the box_size parameter.")
             return False
 
+        if type(self.REGIONS) != list or len(self.REGIONS) > MAX_REGIONS:
+            print(
+                "Error: Invalid color_scheme.regions parameter value. Must be a list of at most {} regions.".format(MAX_REGIONS))
+            return False
+
+        for region in self.REGIONS:
+            if type(region) != dict or not utils.is_color_hex(region.get('mask_color', '')):
+                print(
+                    "Error: Invalid color_scheme.regions parameter value. Each region must have a mask_color of the form '#xxxxxx'.")
+                return False
+
+            if region['mask_color'].upper() in ['#000000', '#FFFFFF']:
+                print(
+                    "Error: Invalid color_scheme.regions parameter value. Cannot use black or white as a region's mask_color.")
+                return False
+
+            if type(region.get('colors')) != list or not region['colors']:
+                print(
+                    "Error: Invalid color_scheme.regions parameter value. Each region must have a non-empty list of colors.")
+                return False
+
+            for entry in region['colors']:
+                scheme_entry = utils.color_scheme_entry(entry)
+                if scheme_entry is None or scheme_entry[1] <= 0 or not utils.is_color_hex(scheme_entry[0]):
+                    print(
+                        "Error: Invalid color_scheme.regions parameter value. Each color must be a color hex or a [color hex, weight] pair with a positive weight.")
+                    return False
+
+        if len(self.REGION_CODES) != len(self.REGIONS):
+            print(
+                "Error: Invalid color_scheme.regions parameter value. Each region must have a different mask_color.")
+            return False
+
+        if self.REGIONS and self.FILE_NAME.endswith('.mask'):
+            print(
+                "Error: Invalid color_scheme.regions parameter value. A raw mask only holds the figure, so it cannot be used with regions.")
+            return False
+
         return True
 
 
 class MCConst(ModelConst):
-    def __init__(self, mode, benchmark_iterations, file_name, preprocess_img,
-                 width, height, wall_radius, max_filled_area_ratio,
+    def __init__(self, mode, benchmark_iterations, benchmark_workers,
+                 benchmark_warmup, benchmark_baseline, file_name, preprocess_img,
+                 width, height, wall_radius, outline, max_filled_area_ratio,
                  min_circle_radius, max_circle_radius, fig_color_scheme,
-                 bg_color_scheme):
+                 bg_color_scheme, luminance_jitter, min_acceptance_rate,
+                 min_fill_rate, convergence_window, save_convergence,
+                 profile_enabled, profile_interval, profile_format,
+                 deadline_enabled, deadline_seconds, deadline_slices):
         ModelConst.__init__(
-            self, mode, benchmark_iterations, file_name, preprocess_img, width,
-            height, wall_radius, max_filled_area_ratio, min_circle_radius,
-            max_circle_radius, fig_color_scheme, bg_color_scheme
+            self, mode, benchmark_iterations, benchmark_workers,
+            benchmark_warmup, benchmark_baseline, file_name, preprocess_img, width,
+            height, wall_radius, outline, max_filled_area_ratio, min_circle_radius,
+            max_circle_radius, fig_color_scheme, bg_color_scheme,
+            luminance_jitter, min_acceptance_rate, min_fill_rate,
+            convergence_window, save_convergence, profile_enabled,
+            profile_interval, profile_format, deadline_enabled,
+            deadline_seconds, deadline_slices
         )
 
 
@@ -162,7 +460,29 @@ config.close()
 
 gbipg_mode = config_json['gbipg_config']['run']['mode']
 gbipg_benchmark_iterations = config_json['gbipg_config']['run']['benchmark_iterations']
+gbipg_benchmark_workers = config_json['gbipg_config']['run']['benchmark_workers']
+gbipg_benchmark_warmup = config_json['gbipg_config']['run']['benchmark_warmup']
+gbipg_benchmark_baseline = config_json['gbipg_config']['run']['benchmark_baseline']
 gbipg_save_states = config_json['gbipg_config']['run']['save_states']
+gbipg_snapshot_interval = config_json['gbipg_config']['run']['snapshot_interval']
+gbipg_min_acceptance_rate = config_json['gbipg_config']['run']['convergence']['min_acceptance_rate']
+gbipg_min_fill_rate = config_json['gbipg_config']['run']['convergence']['min_fill_rate']
+gbipg_convergence_window = config_json['gbipg_config']['run']['convergence']['window']
+gbipg_save_convergence = config_json['gbipg_config']['run']['convergence']['save_curve']
+gbipg_profile_enabled = config_json['gbipg_config']['run']['profile']['enabled']
+gbipg_profile_interval = config_json['gbipg_config']['run']['profile']['interval']
+gbipg_profile_format = config_json['gbipg_config']['run']['profile']['format']
+gbipg_deadline_enabled = config_json['gbipg_config']['run']['deadline']['enabled']
+gbipg_deadline_seconds = config_json['gbipg_config']['run']['deadline']['seconds']
+gbipg_deadline_slices = config_json['gbipg_config']['run']['deadline']['slices']
+gbipg_verify_time_budget = config_json['gbipg_config']['run']['verify']['time_budget']
+gbipg_verify_time_budgets = config_json['gbipg_config']['run']['verify']['time_budgets']
+gbipg_library_enabled = config_json['gbipg_config']['run']['library']['enabled']
+gbipg_library_directory = config_json['gbipg_config']['run']['library']['directory']
+gbipg_library_max_entries = config_json['gbipg_config']['run']['library']['max_entries']
+gbipg_library_max_distance = config_json['gbipg_config']['run']['library']['max_distance']
+gbipg_background_cache_enabled = config_json['gbipg_config']['run']['background_cache']['enabled']
+gbipg_background_cache_directory = config_json['gbipg_config']['run']['background_cache']['directory']
 
 gbipg_file_name = config_json['gbipg_config']['image']['file_name']
 gbipg_preprocess_img = config_json['gbipg_config']['image']['preprocess']
@@ -170,6 +490,7 @@ gbipg_preprocess_img = config_json['gbipg_config']['image']['preprocess']
 gbipg_width = config_json['gbipg_config']['plate']['width']
 gbipg_height = config_json['gbipg_config']['plate']['height']
 gbipg_wall_radius = config_json['gbipg_config']['plate']['wall_radius']
+gbipg_outline = config_json['gbipg_config']['plate']['outline']
 gbipg_max_filled_area_ratio = config_json['gbipg_config']['plate']['max_filled_area_ratio']
 
 gbipg_min_circle_radius = config_json['gbipg_config']['plate']['circles']['min_radius']
@@ -178,16 +499,40 @@ gbipg_box_size = config_json['gbipg_config']['plate']['circles']['box_size']
 
 gbipg_fig_color_scheme = config_json['gbipg_config']['plate']['circles']['color_scheme']['figure']
 gbipg_bg_color_scheme = config_json['gbipg_config']['plate']['circles']['color_scheme']['background']
+gbipg_luminance_jitter = config_json['gbipg_config']['plate']['circles']['color_scheme']['luminance_jitter']
+gbipg_regions = config_json['gbipg_config']['plate']['circles']['color_scheme']['regions']
 
 GBIPG_CONST = GBIPGConst(
-    gbipg_mode, gbipg_benchmark_iterations, gbipg_file_name, gbipg_preprocess_img,
-    gbipg_width, gbipg_height, gbipg_wall_radius, gbipg_max_filled_area_ratio,
+    gbipg_mode, gbipg_benchmark_iterations, gbipg_benchmark_workers,
+    gbipg_benchmark_warmup, gbipg_benchmark_baseline, gbipg_file_name, gbipg_preprocess_img,
+    gbipg_width, gbipg_height, gbipg_wall_radius, gbipg_outline,
+    gbipg_max_filled_area_ratio,
     gbipg_min_circle_radius, gbipg_max_circle_radius, gbipg_fig_color_scheme,
-    gbipg_bg_color_scheme, gbipg_save_states, gbipg_box_size
+    gbipg_bg_color_scheme, gbipg_luminance_jitter, gbipg_min_acceptance_rate,
+    gbipg_min_fill_rate, gbipg_convergence_window, gbipg_save_convergence,
+    gbipg_profile_enabled, gbipg_profile_interval, gbipg_profile_format,
+    gbipg_deadline_enabled, gbipg_deadline_seconds, gbipg_deadline_slices, gbipg_save_states,
+    gbipg_snapshot_interval, gbipg_verify_time_budget, gbipg_verify_time_budgets,
+    gbipg_library_enabled, gbipg_library_directory, gbipg_library_max_entries,
+    gbipg_library_max_distance, gbipg_background_cache_enabled,
+    gbipg_background_cache_directory, gbipg_box_size, gbipg_regions
 )
 
 mc_mode = config_json['mc_config']['run']['mode']
 mc_benchmark_iterations = config_json['mc_config']['run']['benchmark_iterations']
+mc_benchmark_workers = config_json['mc_config']['run']['benchmark_workers']
+mc_benchmark_warmup = config_json['mc_config']['run']['benchmark_warmup']
+mc_benchmark_baseline = config_json['mc_config']['run']['benchmark_baseline']
+mc_min_acceptance_rate = config_json['mc_config']['run']['convergence']['min_acceptance_rate']
+mc_min_fill_rate = config_json['mc_config']['run']['convergence']['min_fill_rate']
+mc_convergence_window = config_json['mc_config']['run']['convergence']['window']
+mc_save_convergence = config_json['mc_config']['run']['convergence']['save_curve']
+mc_profile_enabled = config_json['mc_config']['run']['profile']['enabled']
+mc_profile_interval = config_json['mc_config']['run']['profile']['interval']
+mc_profile_format = config_json['mc_config']['run']['profile']['format']
+mc_deadline_enabled = config_json['mc_config']['run']['deadline']['enabled']
+mc_deadline_seconds = config_json['mc_config']['run']['deadline']['seconds']
+mc_deadline_slices = config_json['mc_config']['run']['deadline']['slices']
 
 mc_file_name = config_json['mc_config']['image']['file_name']
 mc_preprocess_img = config_json['mc_config']['image']['preprocess']
@@ -195,6 +540,7 @@ mc_preprocess_img = config_json['mc_config']['image']['preprocess']
 mc_width = config_json['mc_config']['plate']['width']
 mc_height = config_json['mc_config']['plate']['height']
 mc_wall_radius = config_json['mc_config']['plate']['wall_radius']
+mc_outline = config_json['mc_config']['plate']['outline']
 mc_max_filled_area_ratio = config_json['mc_config']['plate']['max_filled_area_ratio']
 
 mc_min_circle_radius = config_json['mc_config']['plate']['circles']['min_radius']
@@ -202,9 +548,15 @@ mc_max_circle_radius = config_json['mc_config']['plate']['circles']['max_radius'
 
 mc_fig_color_scheme = config_json['mc_config']['plate']['circles']['color_scheme']['figure']
 mc_bg_color_scheme = config_json['mc_config']['plate']['circles']['color_scheme']['background']
+mc_luminance_jitter = config_json['mc_config']['plate']['circles']['color_scheme']['luminance_jitter']
 
 MC_CONST = MCConst(
-    mc_mode, mc_benchmark_iterations, mc_file_name, mc_preprocess_img, mc_width,
-    mc_height, mc_wall_radius, mc_max_filled_area_ratio, mc_min_circle_radius,
-    mc_max_circle_radius, mc_fig_color_scheme, mc_bg_color_scheme
+    mc_mode, mc_benchmark_iterations, mc_benchmark_workers, mc_benchmark_warmup,
+    mc_benchmark_baseline, mc_file_name, mc_preprocess_img, mc_width,
+    mc_height, mc_wall_radius, mc_outline, mc_max_filled_area_ratio, mc_min_circle_radius,
+    mc_max_circle_radius, mc_fig_color_scheme, mc_bg_color_scheme,
+    mc_luminance_jitter, mc_min_acceptance_rate, mc_min_fill_rate,
+    mc_convergence_window, mc_save_convergence, mc_profile_enabled,
+    mc_profile_interval, mc_profile_format, mc_deadline_enabled,
+    mc_deadline_seconds, mc_deadline_slices
 )
@@ -0,0 +1,107 @@
+import time
+
+
+class ConvergenceMonitor:
+    '''
+    Keeps track of how fast a loop that places random or candidate circles is
+    filling the plate, so that the loop can stop once placing more circles is
+    no longer worth the time.
+
+    Every window samples (i.e. circles tried), the monitor records a point of
+    the convergence curve and computes the acceptance rate and the fill rate
+    (gain in fill ratio per second) over that window. If either of them falls
+    below its floor, should_stop() returns True. It also returns True once the
+    deadline, if set, has passed.
+
+    Attributes:
+        total_area: float
+        filled_area: float
+        min_acceptance_rate: float := 0.0 disables this floor.
+        min_fill_rate: float := 0.0 disables this floor.
+        window: int
+        samples: int := Number of circles tried so far.
+        accepted: int := Number of circles placed so far.
+        curve: list[tuple[float, int, float]] := (elapsed seconds, samples,
+                                                  fill ratio) points.
+        stop_reason: str | None
+        deadline: float | None := Time (see time.time()) at which to stop.
+    '''
+
+    def __init__(self, total_area, min_acceptance_rate, min_fill_rate, window):
+        self.total_area = total_area
+        self.min_acceptance_rate = min_acceptance_rate
+        self.min_fill_rate = min_fill_rate
+        self.window = window
+        self.deadline = None
+        self.start(0.0)
+
+    def start(self, filled_area):
+        '''Reset the monitor. Call this right before the loop starts.'''
+        self.filled_area = filled_area
+        self.samples = 0
+        self.accepted = 0
+        self.stop_reason = None
+        self.curve = [(0.0, 0, self.fill_ratio())]
+
+        self._start_time = time.time()
+        self._window_accepted = 0
+        self._window_start = (0.0, self.fill_ratio())
+
+    def fill_ratio(self):
+        return self.filled_area / self.total_area
+
+    def record(self, accepted, area=0.0):
+        '''Record a sample. area is the area added to the plate if accepted.'''
+        self.samples += 1
+        if accepted:
+            self.accepted += 1
+            self._window_accepted += 1
+            self.filled_area += area
+
+        if self.samples % self.window == 0:
+            self._end_window()
+
+    def should_stop(self):
+        if self.stop_reason is None and self.deadline is not None and time.time() >= self.deadline:
+            self.stop_reason = 'deadline reached'
+
+        return self.stop_reason is not None
+
+    def finish(self):
+        '''Record the last point of the curve. Call this after the loop ends.'''
+        elapsed = time.time() - self._start_time
+        if self.curve[-1][1] != self.samples:
+            self.curve.append((elapsed, self.samples, self.fill_ratio()))
+
+    def save_curve(self, file_name):
+        '''Save the convergence curve as a CSV file.'''
+        out = open(savePath(file_name), 'w')
+        out.write('seconds,samples,fill_ratio\n')
+        for elapsed, samples, fill_ratio in self.curve:
+            out.write('{:.4f},{},{:.5f}\n'.format(elapsed, samples, fill_ratio))
+        out.close()
+
+    def summary(self):
+        elapsed = time.time() - self._start_time
+        acceptance_rate = float(self.accepted) / self.samples if self.samples else 0.0
+        return 'Fill ratio: {:.3f} after {} samples in {:.3f} seconds (acceptance rate: {:.3f}).'.format(
+            self.fill_ratio(), self.samples, elapsed, acceptance_rate)
+
+    def _end_window(self):
+        elapsed = time.time() - self._start_time
+        fill_ratio = self.fill_ratio()
+        self.curve.append((elapsed, self.samples, fill_ratio))
+
+        start_time, start_fill_ratio = self._window_start
+        acceptance_rate = float(self._window_accepted) / self.window
+        fill_rate = (fill_ratio - start_fill_ratio) / max(elapsed - start_time, 1e-6)
+
+        if acceptance_rate < self.min_acceptance_rate:
+            self.stop_reason = 'acceptance rate {:.4f} below {}'.format(
+                acceptance_rate, self.min_acceptance_rate)
+        elif fill_rate < self.min_fill_rate:
+            self.stop_reason = 'fill rate {:.4f}/s below {}/s'.format(
+                fill_rate, self.min_fill_rate)
+
+        self._window_accepted = 0
+        self._window_start = (elapsed, fill_ratio)
@@ -0,0 +1,108 @@
+import time
+
+
+class Deadline:
+    '''
+    A wall-clock deadline for generating a plate, split into a budget for each
+    phase of the algorithm. A phase should end by the time the budgets of the
+    phases up to it have run out, so a phase that ends early leaves its spare
+    time to the phases after it. The phases that can cut their work short
+    (e.g. the crevice filling) stop at that time, and the time each phase took
+    is kept so that the phases that overran their budget can be reported. The
+    budget of a phase is the time it had when it started, i.e. its slice plus
+    the spare time left by the phases before it, or less if they overran.
+
+    Attributes:
+        seconds: float
+        phases: list[str] := The phases of the algorithm, in order.
+        slices: dict[str, float] := Fraction of seconds that each phase gets.
+        durations: dict[str, float] := Seconds taken by each phase so far.
+        budgets: dict[str, float] := Seconds each phase had when it started.
+        notes: list[str] := How the phases cut their work short to keep to the deadline.
+    '''
+
+    def __init__(self, seconds, phases, slices):
+        self.seconds = seconds
+        self.phases = phases
+        self.slices = slices
+        self.durations = {}
+        self.budgets = {}
+        self.notes = []
+        self._start_time = None
+        self._phase = None
+        self._phase_start_time = None
+        self._last_end_time = None
+
+    def start_phase(self, phase):
+        ''' End the current phase, if any, and start the given one.'''
+        if phase == self._phase:
+            return
+
+        self.end_phase()
+        now = time.time()
+        if self._start_time is None:
+            self._start_time = now
+
+        self._phase = phase
+        self._phase_start_time = now
+        self.budgets[phase] = self.end_time() - now
+
+    def end_phase(self):
+        if self._phase is not None:
+            self._last_end_time = time.time()
+            self.durations[self._phase] = self._last_end_time - self._phase_start_time
+            self._phase = None
+
+    def end_time(self):
+        ''' Return the time (see time.time()) by which the current phase should end.'''
+        indx = self.phases.index(self._phase)
+        return self._start_time + self.seconds * sum([self.slices[phase] for phase in self.phases[:indx + 1]])
+
+    def remaining(self):
+        ''' Return the number of seconds left until the current phase should end.'''
+        return self.end_time() - time.time()
+
+    def note(self, text):
+        self.notes.append('{}: {}'.format(self._phase, text))
+
+    def overruns(self):
+        ''' Return the phases that took longer than their budget.'''
+        return [phase for phase in self.phases
+                if phase in self.durations and self.durations[phase] > self.budgets[phase]]
+
+    def total(self):
+        ''' Return the number of seconds between the start of the first phase and the end of the last one.'''
+        return self._last_end_time - self._start_time if self._last_end_time is not None else 0.0
+
+    def is_missed(self):
+        return self.total() > self.seconds
+
+    def report(self):
+        lines = []
+        for phase in self.phases:
+            if phase not in self.durations:
+                continue
+
+            budget = max(0.0, self.budgets[phase])
+            line = '    {}: {:.3f} of {:.3f} seconds'.format(phase, self.durations[phase], budget)
+            if phase in self.overruns():
+                line += ' (overran by {:.3f} seconds)'.format(self.durations[phase] - budget)
+            lines.append(line)
+
+        lines.extend(['    ' + note for note in self.notes])
+
+        if self.is_missed():
+            verdict = 'missed by {:.3f} seconds'.format(self.total() - self.seconds)
+        else:
+            verdict = 'met'
+        lines.insert(0, 'Deadline: {:.3f} of {:.3f} seconds, {}, {} phase(s) over budget.'.format(
+            self.total(), self.seconds, verdict, len(self.overruns())))
+        return '\n'.join(lines)
+
+
+def get_deadline(ModelConst):
+    ''' Return a new Deadline from the deadline parameters, or None if they disable it.'''
+    if not ModelConst.DEADLINE_ENABLED:
+        return None
+
+    return Deadline(ModelConst.DEADLINE_SECONDS, ModelConst.PHASES, ModelConst.DEADLINE_SLICES)
@@ -0,0 +1,189 @@
+import heapq
+import math
+
+import utils
+
+
+def apollonius(c1, c2, c3):
+    '''
+    Solve the Problem of Apollonius for three circles: find every circle that
+    is tangent to all three of them.
+
+    Each given circle is a tuple (x, y, s) where s is a signed radius. A
+    positive s means the solution lies outside of the circle, at distance
+    r + s from its center (e.g. another circle on the plate), and a negative s
+    means the solution lies inside of it, at distance -s - r from its center
+    (e.g. the wall of the plate).
+
+    Parameters:
+        c1: tuple[float, float, float]
+        c2: tuple[float, float, float]
+        c3: tuple[float, float, float]
+
+    Return Value:
+        solutions: list[tuple[float, float, float]] := (x, y, r) of each
+                                                        solution with r > 0.
+    '''
+    x1, y1, s1 = c1
+    x2, y2, s2 = c2
+    x3, y3, s3 = c3
+
+    # Subtracting the equation of c1 from those of c2 and c3 leaves two
+    # equations that are linear in x, y and r.
+    a2, b2, k2 = 2.0*(x2 - x1), 2.0*(y2 - y1), 2.0*(s2 - s1)
+    a3, b3, k3 = 2.0*(x3 - x1), 2.0*(y3 - y1), 2.0*(s3 - s1)
+    d2 = (x2*x2 + y2*y2 - s2*s2) - (x1*x1 + y1*y1 - s1*s1)
+    d3 = (x3*x3 + y3*y3 - s3*s3) - (x1*x1 + y1*y1 - s1*s1)
+
+    det = a2*b3 - a3*b2
+    if abs(det) < 1e-9:
+        return []
+
+    # x = x0 + xr*r and y = y0 + yr*r
+    x0, xr = (d2*b3 - d3*b2) / det, (k3*b2 - k2*b3) / det
+    y0, yr = (a2*d3 - a3*d2) / det, (a3*k2 - a2*k3) / det
+
+    u, v = x0 - x1, y0 - y1
+    a = xr*xr + yr*yr - 1.0
+    b = 2.0*(u*xr + v*yr - s1)
+    c = u*u + v*v - s1*s1
+
+    if abs(a) < 1e-12:
+        roots = [-c / b] if abs(b) > 1e-12 else []
+    else:
+        disc = b*b - 4.0*a*c
+        if disc < 0:
+            return []
+        sqrt_disc = math.sqrt(disc)
+        roots = [(-b - sqrt_disc) / (2.0*a), (-b + sqrt_disc) / (2.0*a)]
+
+    # A solution of a circle with a negative s must fit inside of it.
+    max_r = min([-s for s in (s1, s2, s3) if s < 0] or [float('inf')])
+
+    return [(x0 + xr*r, y0 + yr*r, r) for r in roots if 0 < r < max_r]
+
+
+class GapFiller:
+    '''
+    Fill the gaps left between the circles of the plate by repeatedly placing
+    the largest circle that fits in any gap. The gaps are the triangles formed
+    by three neighbouring circles, or by two neighbouring circles and the
+    wall, and the circle that fits a gap is the one tangent to its three sides
+    (see apollonius()) shrunk so that it does not cross the figure boundary.
+    The plate's max_dist should be at least max_radius + gap so that the wall
+    gaps can be found.
+
+    Attributes:
+        grid: CircleGrid := Every circle on the plate, including the new ones.
+        min_radius: float := Gaps that only fit smaller circles are ignored.
+        max_radius: float
+        gap: float := Two circles are neighbours when their edges are less
+                      than gap apart.
+    '''
+
+    def __init__(self, grid, mask, plate, min_radius, max_radius, gap):
+        self.grid = grid
+        self.min_radius = min_radius
+        self.max_radius = max_radius
+        self.gap = gap
+        self._mask = mask
+        self._plate = plate
+        self._heap = []
+        self._count = 0
+
+    def fill(self, monitor, max_filled_area, settled=0):
+        '''
+        Place circles until max_filled_area is reached, there are no gaps
+        left for circles of at least min_radius, or the monitor says to stop.
+        Every gap taken out of the queue counts as a sample of the monitor.
+
+        Parameters:
+            monitor: ConvergenceMonitor := Started with the area already filled.
+            max_filled_area: float
+            settled: int := Number of circles at the start of grid.circles whose
+                            gaps between each other are already filled, e.g.
+                            those of a cached background. Only the gaps with
+                            another circle as a corner are filled.
+
+        Yields:
+            (x, y, r, code): tuple[float, float, float, int] := code is the
+                             mask code of the region of the circle's center.
+        '''
+        for indx in range(settled, len(self.grid.circles)):
+            if monitor.should_stop():
+                return
+
+            self._push_gaps(indx, True, settled)
+
+        while self._heap and monitor.filled_area < max_filled_area and not monitor.should_stop():
+            neg_r, _, x, y = heapq.heappop(self._heap)
+            r = self._get_radius(x, y)
+
+            if r < self.min_radius:
+                monitor.record(False)
+                continue
+
+            # The gap has shrunk since it was pushed. Re-queue it with its
+            # current radius so that larger gaps are placed first.
+            if r < -neg_r - 1e-6:
+                self._push(x, y, r)
+                monitor.record(False)
+                continue
+
+            indx = self.grid.add(x, y, r)
+            self._push_gaps(indx, False)
+            monitor.record(True, math.pi * r**2)
+            yield (x, y, r, self._mask.region_at(x, y))
+
+    def _push_gaps(self, indx, only_later, settled=0):
+        '''
+        Push every gap that has the circle at indx as a corner. If only_later
+        is True, only gaps whose other corners have a larger index or are
+        settled (see fill()) are pushed, so that each gap is pushed once when
+        the circles are added in order.
+        '''
+        c1 = self.grid.circles[indx]
+        neighbours = self.grid.neighbours(indx, self.gap)
+        if only_later:
+            neighbours = [n for n in neighbours if n > indx or n < settled]
+
+        near_wall = self._wall_gap(c1) < self.gap
+        for i, n2 in enumerate(neighbours):
+            c2 = self.grid.circles[n2]
+            if near_wall and self._wall_gap(c2) < self.gap:
+                wall = self._plate.wall_circle((c1[0] + c2[0]) / 2.0, (c1[1] + c2[1]) / 2.0)
+                if wall is not None:
+                    self._push_gap(c1, c2, wall)
+
+            for n3 in neighbours[i + 1:]:
+                c3 = self.grid.circles[n3]
+                if utils.distance(c2[:2], c3[:2]) - c2[2] - c3[2] < self.gap:
+                    self._push_gap(c1, c2, c3)
+
+    def _push_gap(self, c1, c2, c3):
+        for x, y, r in apollonius(c1, c2, c3):
+            if r < self.min_radius:
+                continue
+
+            r = self._get_radius(x, y)
+            if r >= self.min_radius:
+                self._push(x, y, r)
+
+    def _push(self, x, y, r):
+        self._count += 1
+        heapq.heappush(self._heap, (-r, self._count, x, y))
+
+    def _wall_gap(self, c):
+        return self._plate.wall_distance(c[0], c[1]) - c[2]
+
+    def _get_radius(self, x, y):
+        ''' Largest radius a circle with center (x, y) can have.'''
+        r = min(self.max_radius, self._plate.wall_distance(x, y))
+        if r < self.min_radius:
+            return r
+
+        r = self.grid.clearance(x, y, r)
+        if r < self.min_radius:
+            return r
+
+        return self._mask.nearest_opposite_distance(x, y, self._mask.region_at(x, y), r)
@@ -1,25 +1,47 @@
 import time
 import random as rand
+from array import array
 import json
 import math
-
-from img import getImage
-from classes import Point, CirclesAdjacencyGraph
+import os
+import threading
+
+from java.util.concurrent import Callable, Executors
+
+from img import getImage, getPlate, getOutlinePixels, getMaskPyramid
+from mask import MaskPyramid
+from stream import SnapshotWriter
+from classes import Point, CirclesAdjacencyGraph, CircleGrid
+from gapfill import GapFiller
+from convergence import ConvergenceMonitor
+from verify import check_layout
+from palette import ColorScheme, assign_colors
+from raster import CircleRenderer, RGBImage, BlankPixels
+from library import LayoutLibrary, BackgroundCache, mask_signature, fit_layout, cut_out_figure, file_digest
+import benchmark
+import modes
+import profiler
 from const import GBIPG_CONST, RED_COLOR_SCHEME, WHITE_RGB
 import utils
 import const
 
+# Held while the background cache is read or written, as the iterations of the
+# benchmark mode run on several threads.
+_background_lock = threading.Lock()
+
 def settings():
     size(GBIPG_CONST.WIDTH, GBIPG_CONST.HEIGHT)
 
 def setup():
     if GBIPG_CONST.is_parameters_valid():
+        if GBIPG_CONST.MODE == 'verify':
+            verify_mode()
+            return
+
         img = getImage(GBIPG_CONST.FILE_NAME, GBIPG_CONST, GBIPG_CONST.PREPROCESS_IMG)
         if img:
-            if GBIPG_CONST.MODE == 'normal':
-                normal_mode(img)
-            elif GBIPG_CONST.MODE == 'benchmark':
-                benchmark_mode(img, GBIPG_CONST.BENCHMARK_ITERATIONS)
+            if not modes.run_mode(img, GBIPG_CONST, run, run_benchmarked, 'GBIPG'):
+                exit()
         else:
             print('Failed.')
             exit()
@@ -27,310 +49,774 @@ def setup():
         print('Failed.')
         exit()
 
-def normal_mode(img):
-    '''Run the algorithm normally.
-
-    Parameters:
-        img: PImage
+def verify_mode():
+    '''
+    Run the algorithm on every PNG image in the 'data' folder and check that each
+    generated plate is valid (see verify.check_layout()) and was generated within
+    its time budget. The budget of an image is its entry in verify.time_budgets,
+    or verify.time_budget if it has none. The plates are drawn into an RGBImage
+    (see raster.py) instead of the canvas. If the profile.enabled parameter is set,
+    a profile of each image is saved as well, so that the profiles of two commits
+    can be compared image by image.
     '''
     print('Program start.')
-    run(img)
-    print('Success.')
+    file_names = sorted([file_name for file_name in os.listdir(dataPath(''))
+                         if file_name.endswith('.png') and file_name != GBIPG_CONST.OUTLINE])
+    outline_pxls = getOutlinePixels(GBIPG_CONST)
+    failed = []
+
+    for file_name in file_names:
+        img = getImage(file_name, GBIPG_CONST, True)
+        if not img:
+            print('{}: failed to load the image.'.format(file_name))
+            failed.append(file_name)
+            continue
+
+        budget = GBIPG_CONST.VERIFY_TIME_BUDGETS.get(file_name, GBIPG_CONST.VERIFY_TIME_BUDGET)
+        plate = get_plate()
+        image = RGBImage(GBIPG_CONST.WIDTH, GBIPG_CONST.HEIGHT)
+
+        start_time = time.time()
+        circles = profiler.run_profiled(lambda: list(GBIPG_stream(img, None, None, plate, image)),
+                                        GBIPG_CONST, file_name)
+        duration = round(time.time() - start_time, 3)
+
+        report = check_layout(circles, img.pixels, GBIPG_CONST, outline_pxls)
+        passed = report.is_valid() and duration <= budget
+        if not passed:
+            failed.append(file_name)
 
-def benchmark_mode(img, iterations):
-    '''Benchmark the algorithm to determine its average runtime and variance.
+        print('{}: {} in {} seconds (budget: {} seconds).'.format(
+            file_name, 'passed' if passed else 'FAILED', duration, budget))
+        print('    ' + report.summary())
+
+    if failed:
+        print('Failed: {}.'.format(', '.join(failed)))
+    else:
+        print('Success.')
+
+def run(img, image=None, deadline=None):
+    snapshots = None
+    if image is None:
+        background(const.WHITE)
+        snapshots = SnapshotWriter(GBIPG_CONST.SNAPSHOT_INTERVAL)
+    try:
+        if GBIPG_CONST.LIBRARY_ENABLED:
+            return GBIPG_with_library(img, snapshots, image, deadline)
+        return GBIPG(img, snapshots, image, deadline)
+    finally:
+        if snapshots:
+            snapshots.close()
+
+def run_benchmarked(img, image, deadline):
+    ''' Generate a plate in an iteration of the benchmark mode, which never uses the layout library.'''
+    return GBIPG(img, None, image, deadline)
+
+def GBIPG(img, snapshots=None, image=None, deadline=None):
+    ''' 
+    Generate compactly-filled, randomized circles on the background and the 
+    figure using the Graph-based Ishihara Plate Generation (GBIPG) Algorithm.
 
     Parameters:
-        img: PImage
-        iterations: int := How many times the algorithm will be run.
+        img: PImage | RawMask := The pixels of the image reference.
+        snapshots: SnapshotWriter | None := Used to save the states of the
+                                            algorithm, if given.
+        image: RGBImage | None := The circles are drawn into it instead of
+                                  the canvas, if given.
+        deadline: Deadline | None := The phases of the algorithm cut their work
+                                     short to keep to it, if given.
+
+    Return Value:
+        monitor: ConvergenceMonitor := Convergence of the crevice filling.
     '''
-    print('Program start.')
-    avg_time = 0.0
-    variance = 0.0
-    duration_list = []
+    if deadline:
+        deadline.start_phase('setup')
+    plate = get_plate()
+    monitor = get_convergence_monitor(plate)
+    for _ in GBIPG_stream(img, snapshots, monitor, plate, image, None, deadline):
+        pass
+
+    if deadline:
+        deadline.end_phase()
+    return monitor
+
+def GBIPG_with_library(img, snapshots=None, image=None, deadline=None):
+    '''
+    Same as GBIPG() but first looks for a stored layout whose mask is close to
+    the mask of img in the layout library (see library.py). If there is one, it
+    is fitted on the plate and only the crevices are filled. Otherwise, the
+    plate is generated from scratch and its layout is added to the library.
 
-    for i in range(1, iterations+1):
-        start_time = time.time()
+    Parameters:
+        img: PImage | RawMask := The pixels of the image reference.
+        snapshots: SnapshotWriter | None := Used to save the states of the
+                                            algorithm, if given.
+        image: RGBImage | None := See GBIPG().
+        deadline: Deadline | None := See GBIPG().
 
-        run(img)
+    Return Value:
+        monitor: ConvergenceMonitor := Convergence of the crevice filling.
+    '''
+    if deadline:
+        deadline.start_phase('setup')
+    library = LayoutLibrary(sketchPath(GBIPG_CONST.LIBRARY_DIRECTORY), GBIPG_CONST.LIBRARY_MAX_ENTRIES)
+    plate = get_plate()
+    monitor = get_convergence_monitor(plate)
+
+    img.loadPixels()
+    mask = getMaskPyramid(img, GBIPG_CONST)
+    key = get_layout_key()
+    bounds = mask.figure_bounds() or (0, 0, GBIPG_CONST.WIDTH, GBIPG_CONST.HEIGHT)
+    signature = mask_signature(mask, bounds)
+    entry = library.find(key, signature, GBIPG_CONST.LIBRARY_MAX_DISTANCE)
+
+    if entry is not None:
+        circles = fit_layout(library.load(entry), entry['bounds'], bounds, mask, plate,
+                             GBIPG_CONST.MIN_CIRCLE_RADIUS, GBIPG_CONST.MAX_CIRCLE_RADIUS)
+        for _ in finish_plate(circles, mask, plate, snapshots, monitor, image, deadline):
+            pass
+    else:
+        circles = [circle[:3] for circle in GBIPG_stream(img, snapshots, monitor, plate, image, mask, deadline)]
+        library.add(key, signature, bounds, circles)
 
-        duration = round(time.time() - start_time, 3)
-        duration_list.append(duration)
-        avg_time += duration
-        print('Iteration {} of {}: {} seconds.'.format(i, iterations, duration))
+    if deadline:
+        deadline.end_phase()
 
-    print('Success.')
-    avg_time = round(avg_time / iterations, 3)
-    variance = round(sum([(duration - avg_time)**2 for duration in duration_list]) / iterations, 3)
-    
-    print('Average runtime: {} seconds'.format(avg_time))
-    print('Variance: {}'.format(variance))
+    library.save()
+    print(library.summary())
+    return monitor
 
-def run(img):
-    background(const.WHITE)
-    GBIPG(img)
+def get_layout_key():
+    ''' 
+    The parameters that a stored layout must have been generated with to be
+    reused. The size of the canvas is left out, as a layout can be scaled,
+    but the proportions of the canvas and the wall are kept. The outline is
+    given by the digest of its file, as in get_background_key().
+    '''
+    outline_digest = file_digest(dataPath(GBIPG_CONST.OUTLINE)) if GBIPG_CONST.OUTLINE else None
+    return [GBIPG_CONST.OUTLINE, outline_digest, round(float(GBIPG_CONST.HEIGHT) / GBIPG_CONST.WIDTH, 4),
+            round(float(GBIPG_CONST.WALL_RADIUS) / GBIPG_CONST.WIDTH, 4),
+            GBIPG_CONST.MAX_FILLED_AREA_RATIO, GBIPG_CONST.MIN_CIRCLE_RADIUS,
+            GBIPG_CONST.MAX_CIRCLE_RADIUS, GBIPG_CONST.BOX_SIZE]
 
-def GBIPG(img):
+def get_background_key():
     ''' 
-    Generate compactly-filled, randomized circles on the background and the 
-    figure using the Graph-based Ishihara Plate Generation (GBIPG) Algorithm.
+    The parameters that the background layout of a plate depends on (see get_background()).
+    The outline is given by the digest of its file, so that editing it solves the background again.
+    '''
+    outline_digest = file_digest(dataPath(GBIPG_CONST.OUTLINE)) if GBIPG_CONST.OUTLINE else None
+    return [GBIPG_CONST.WIDTH, GBIPG_CONST.HEIGHT, GBIPG_CONST.WALL_RADIUS, GBIPG_CONST.OUTLINE,
+            outline_digest, GBIPG_CONST.MAX_FILLED_AREA_RATIO, GBIPG_CONST.MIN_CIRCLE_RADIUS,
+            GBIPG_CONST.MAX_CIRCLE_RADIUS, GBIPG_CONST.BOX_SIZE]
+
+def get_background(plate):
+    '''
+    Return the circles of the plate solved and with its crevices filled as if it
+    had no figure, from the background cache (see library.BackgroundCache). If
+    it has none for the current parameters, the background is solved and added
+    to the cache.
 
     Parameters:
-        img: PImage := The pixels of the image reference.
+        plate: Plate
 
     Return Value:
-        None
+        circles: list[tuple[float, float, float]] := (x, y, r) of each circle.
+    '''
+    with _background_lock:
+        cache = BackgroundCache(sketchPath(GBIPG_CONST.BACKGROUND_CACHE_DIRECTORY))
+        key = get_background_key()
+        circles = cache.load(key)
+        if circles is None:
+            print('Solving the background of the plate for the background cache.')
+            circles = solve_background(plate)
+            cache.save(key, circles)
+
+    return circles
+
+def solve_background(plate):
+    ''' 
+    Return the (x, y, r) circles of the plate as if it had no figure: the solved nodes
+    of its CAG, then the circles that fill its crevices.
     '''
-    img.loadPixels
-    fig_random_points, bg_random_points = generate_random_points(img.pixels)
+    blank_pxls = BlankPixels(GBIPG_CONST.WIDTH * GBIPG_CONST.HEIGHT)
+    blank_mask = MaskPyramid(blank_pxls, GBIPG_CONST, bytearray(GBIPG_CONST.WIDTH * GBIPG_CONST.HEIGHT))
+    region_points = generate_random_points(blank_pxls, blank_mask, plate)
+    circles = [circle[:3] for circle in merge_solved_cags(solve_regions(region_points, blank_mask, plate))
+               if circle[2] > 0]
 
-    fig_cag = build_circles_adjacency_graph(fig_random_points, img.pixels, False)
-    bg_cag = build_circles_adjacency_graph(bg_random_points, img.pixels, True)
+    monitor = get_convergence_monitor(plate)
+    monitor.start(sum([math.pi * r**2 for _, _, r in circles]))
+    gap_filler = get_gap_filler(blank_mask, plate, circles)
+    for x, y, r, _ in gap_filler.fill(monitor, plate.area * GBIPG_CONST.MAX_FILLED_AREA_RATIO):
+        circles.append((x, y, r))
 
-    image(img, 0, 0)
-    solved_fig_cag = solve_csp_of_cag(fig_cag, GBIPG_CONST.FIG_COLOR_SCHEME)
-    solved_bg_cag = solve_csp_of_cag(bg_cag, GBIPG_CONST.BG_COLOR_SCHEME)
-    filled_area = display_final_nodes(solved_fig_cag.nodes, solved_bg_cag.nodes)
+    return circles
+
+
+def get_plate():
+    # Nodes farther than this from the wall are never limited by it, see
+    # also GapFiller.
+    max_dist = 2*GBIPG_CONST.MAX_CIRCLE_RADIUS + GBIPG_CONST.BOX_SIZE
+    return getPlate(GBIPG_CONST, max_dist)
+
+def get_convergence_monitor(plate):
+    return ConvergenceMonitor(plate.area, GBIPG_CONST.MIN_ACCEPTANCE_RATE,
+                              GBIPG_CONST.MIN_FILL_RATE, GBIPG_CONST.CONVERGENCE_WINDOW)
+
+def GBIPG_stream(img, snapshots=None, monitor=None, plate=None, image=None, mask=None, deadline=None):
+    '''
+    Same as GBIPG() but yields each circle of the final plate as soon as it is
+    placed, so that the caller can display the plate while it is being
+    generated. The circles are drawn on the canvas in batches: the solved
+    nodes all at once, and the crevice circles before each progress snapshot
+    and at the end. Closing the generator cancels the generation.
+
+    If the background_cache.enabled parameter is set, the circles of the cached
+    background (see get_background()) that do not cross the figure are kept,
+    and only the random points and the crevices around the figure are solved.
+
+    Parameters:
+        img: PImage | RawMask := The pixels of the image reference.
+        snapshots: SnapshotWriter | None := Used to save the states of the
+                                            algorithm and the throttled progress
+                                            snapshots, if given.
+        monitor: ConvergenceMonitor | None := Tracks the crevice filling. A new
+                                              one is used if not given.
+        plate: Plate | None := Loaded from the parameters if not given.
+        image: RGBImage | None := The circles are drawn into it instead of
+                                  the canvas, if given.
+        mask: MaskPyramid | None := Built from img if not given.
+        deadline: Deadline | None := See GBIPG().
+
+    Yields:
+        (x, y, r, colr): tuple[int, int, float, color]
+    '''
+    if deadline:
+        deadline.start_phase('setup')
+    if plate is None:
+        plate = get_plate()
+
+    img.loadPixels()
+    if mask is None:
+        mask = getMaskPyramid(img, GBIPG_CONST)
+
+    if deadline:
+        deadline.start_phase('seeds')
+    region_points = generate_random_points(img.pixels, mask, plate, snapshots)
+
+    if deadline:
+        deadline.start_phase('graph')
+    fixed_circles, settled = [], []
+    if GBIPG_CONST.BACKGROUND_CACHE_ENABLED:
+        # The corners of a crevice are neighbours (see fill_up_crevices()), so a crevice is
+        # within this reach of each of its corners.
+        reach = 2*GBIPG_CONST.MAX_CIRCLE_RADIUS + GBIPG_CONST.BOX_SIZE
+        settled, border = cut_out_figure(get_background(plate), mask, reach)
+        fixed_circles = settled + border
+        region_points = drop_covered_points(region_points, fixed_circles)
+
+    if deadline:
+        solved_cags = solve_regions_by_deadline(region_points, mask, plate, deadline, snapshots, fixed_circles)
+    else:
+        solved_cags = solve_regions(region_points, mask, plate, snapshots, fixed_circles)
+    circles = merge_solved_cags(solved_cags, fixed_circles)
+
+    for circle in finish_plate(circles, mask, plate, snapshots, monitor, image, deadline, len(settled)):
+        yield circle
 
-    fill_up_crevices(img.pixels, filled_area)
-    
 
-def generate_random_points(img_pxls):
+def finish_plate(circles, mask, plate, snapshots=None, monitor=None, image=None, deadline=None, settled=0):
     '''
-    Return a list of random points in the background and a list of random points in the figure. 
-    The random points are generated such that they do not overlap with other points, 
-    figure boundary, and the canvas wall.
+    Display the given circles, e.g. the solved nodes of the CAGs, and fill up
+    the crevices between them.
+
+    Parameters:
+        circles: list[tuple[float, float, float, int]] := (x, y, r, code) of each
+                                                           circle, where code is
+                                                           the mask code of its center.
+        mask: MaskPyramid
+        plate: Plate
+        snapshots: SnapshotWriter | None
+        monitor: ConvergenceMonitor | None
+        image: RGBImage | None := The circles are drawn into it instead of
+                                  the canvas, if given.
+        deadline: Deadline | None := The crevice filling stops at the end of its
+                                     phase, if given.
+        settled: int := Number of circles at the start of circles whose crevices
+                        are already filled (see gapfill.GapFiller.fill()).
+
+    Yields:
+        (x, y, r, colr): tuple[float, float, float, color]
+    '''
+    if deadline:
+        deadline.start_phase('display')
+    placed = []
+    filled_area = 0.0
+    progress_name = utils.output_file_name(GBIPG_CONST.FILE_NAME, '-progress{}.png')
+    renderer = CircleRenderer(GBIPG_CONST.WIDTH, GBIPG_CONST.HEIGHT, image)
+    for circle in display_circles(circles, renderer, snapshots):
+        placed.append(circle[:3])
+        filled_area += math.pi * circle[2]**2
+        yield circle
+
+    if monitor is None:
+        monitor = get_convergence_monitor(plate)
+    monitor.start(filled_area)
+    end_time = None
+    if deadline:
+        deadline.start_phase('crevices')
+        end_time = deadline.end_time()
+        monitor.deadline = end_time
+
+    for circle in fill_up_crevices(mask, plate, placed, monitor, renderer, settled):
+        yield circle
+        if end_time is not None:
+            # Stop early enough to draw the circles that are not drawn yet by the end of the phase.
+            monitor.deadline = end_time - renderer.flush_time()
+        if snapshots and snapshots.is_due():
+            renderer.flush()
+            snapshots.save(progress_name.format(snapshots.saved))
+
+    renderer.flush()
+    if GBIPG_CONST.SAVE_STATES and snapshots:
+        snapshots.save(utils.output_file_name(GBIPG_CONST.FILE_NAME, '-step4.png'))
+
+
+def get_region_codes():
+    ''' 
+    Return the mask code of each region of the plate: the figure, the extra figure
+    regions, then the background.
+    '''
+    return GBIPG_CONST.figure_codes() + [const.MASK_BG_CODE]
+
+
+def get_color_schemes():
+    ''' Return the ColorScheme of each region of the plate, by mask code.'''
+    schemes = {
+        const.MASK_FIG_CODE: ColorScheme(GBIPG_CONST.FIG_COLOR_SCHEME, GBIPG_CONST.LUMINANCE_JITTER),
+        const.MASK_BG_CODE: ColorScheme(GBIPG_CONST.BG_COLOR_SCHEME, GBIPG_CONST.LUMINANCE_JITTER),
+    }
+    for i, region in enumerate(GBIPG_CONST.REGIONS):
+        schemes[const.MASK_REGION_CODE_START + i] = ColorScheme(region['colors'], GBIPG_CONST.LUMINANCE_JITTER)
+
+    return schemes
+
+
+def generate_random_points(img_pxls, mask, plate, snapshots=None):
+    '''
+    Return the random points in each region of the plate, i.e. in the figure, in each extra figure
+    region and in the background. The random points are generated such that they do not overlap
+    with other points, figure boundary, and the canvas wall.
 
     Parameters:
         img_pxls: list[color]
+        mask: MaskPyramid
+        plate: Plate
+        snapshots: SnapshotWriter | None
 
     Return Value:
-        (fig_random_points, bg_random_points): tuple[list[Point], list[Point]]
+        region_points: dict[int, list[Point]] := The random points of each region, by mask code.
     '''
-    bg_random_points = []
-    fig_random_points = []
+    region_points = dict([(code, []) for code in get_region_codes()])
 
     stroke(const.BLACK)
 
-    start = GBIPG_CONST.WIDTH/2 - GBIPG_CONST.WALL_RADIUS
-    end = GBIPG_CONST.WIDTH/2 + GBIPG_CONST.WALL_RADIUS
-    
     # How distributed the points are in the canvas.
     box_size = GBIPG_CONST.BOX_SIZE
 
-    for i in range(start, end, box_size):
-        for j in range(start, end, box_size):
+    for i in range(plate.x_start, plate.x_end, box_size):
+        for j in range(plate.y_start, plate.y_end, box_size):
             x = int(rand.uniform(
-                    min(end, i + GBIPG_CONST.MIN_CIRCLE_RADIUS), 
-                    min(end, i + box_size - GBIPG_CONST.MIN_CIRCLE_RADIUS)
+                    min(plate.x_end, i + GBIPG_CONST.MIN_CIRCLE_RADIUS), 
+                    min(plate.x_end, i + box_size - GBIPG_CONST.MIN_CIRCLE_RADIUS)
                 ))
             y = int(rand.uniform(
-                    min(end, j + GBIPG_CONST.MIN_CIRCLE_RADIUS), 
-                    min(end, j + box_size - GBIPG_CONST.MIN_CIRCLE_RADIUS)
+                    min(plate.y_end, j + GBIPG_CONST.MIN_CIRCLE_RADIUS), 
+                    min(plate.y_end, j + box_size - GBIPG_CONST.MIN_CIRCLE_RADIUS)
                 ))
             p = Point(x, y, img_pxls, GBIPG_CONST)
             overlap = False
 
-            if p.will_overlap_wall() or p.will_overlap_fig_boundary(img_pxls):
+            if p.will_overlap_wall(plate, GBIPG_CONST.MIN_CIRCLE_RADIUS) or p.will_overlap_fig_boundary(mask):
                 overlap = True
 
             if not overlap:
-                if p.in_fig():
-                    fig_random_points.append(p)
-                else:
-                    bg_random_points.append(p)
+                region_points[p.mask_code()].append(p)
 
-    if GBIPG_CONST.SAVE_STATES:
+    if GBIPG_CONST.SAVE_STATES and snapshots:
         stroke(RED_COLOR_SCHEME[0])
-        for i in range(start, end, box_size):
+        for i in range(plate.x_start, plate.x_end, box_size):
             line(i, 0, i, GBIPG_CONST.HEIGHT)
-            line(0, i, GBIPG_CONST.WIDTH, i)
+        for j in range(plate.y_start, plate.y_end, box_size):
+            line(0, j, GBIPG_CONST.WIDTH, j)
 
         noStroke()
         r = GBIPG_CONST.MIN_CIRCLE_RADIUS
+        schemes = get_color_schemes()
+        for code in get_region_codes():
+            fill(schemes[code].pick())
+            for p in region_points[code]:
+                x, y = p.get_coord()
+                ellipse(x, y, 2*r, 2*r)
+
+        snapshots.save(utils.output_file_name(GBIPG_CONST.FILE_NAME, '-step1.png'))
+        background(WHITE_RGB)
 
-        fill(rand.choice(GBIPG_CONST.FIG_COLOR_SCHEME))
-        for p in fig_random_points:
-            x, y = p.get_coord()
-            ellipse(x, y, 2*r, 2*r)
+    return region_points
 
-        fill(rand.choice(GBIPG_CONST.BG_COLOR_SCHEME))
-        for p in bg_random_points:
+
+def drop_covered_points(region_points, circles):
+    ''' 
+    Return the random points of each region (see generate_random_points()) that have
+    room for a circle of MIN_CIRCLE_RADIUS between the given circles.
+    '''
+    grid = CircleGrid(2*GBIPG_CONST.MAX_CIRCLE_RADIUS)
+    for x, y, r in circles:
+        grid.add(x, y, r)
+
+    min_radius = GBIPG_CONST.MIN_CIRCLE_RADIUS
+    uncovered_points = {}
+    for code, points in region_points.items():
+        uncovered_points[code] = []
+        for p in points:
             x, y = p.get_coord()
-            ellipse(x, y, 2*r, 2*r)
+            if grid.clearance(x, y, min_radius) >= min_radius:
+                uncovered_points[code].append(p)
 
-        img_name = GBIPG_CONST.FILE_NAME.rstrip(".png") + "-step1.png"
-        saveFrame(img_name)
-        background(WHITE_RGB)
+    return uncovered_points
+
+
+class RegionSolver(Callable):
+    ''' A task of the thread pool of solve_regions() that builds and solves the CAG of a region.'''
 
-    return (fig_random_points, bg_random_points)
+    def __init__(self, center_points, mask, plate, fixed_circles):
+        self.center_points = center_points
+        self.mask = mask
+        self.plate = plate
+        self.fixed_circles = fixed_circles
 
+    def call(self):
+        cag = CirclesAdjacencyGraph(self.center_points, self.mask, self.plate, GBIPG_CONST)
+        fixed_grid = CircleGrid(2*GBIPG_CONST.MAX_CIRCLE_RADIUS)
+        for x, y, r in self.fixed_circles:
+            fixed_grid.add(x, y, r)
+        return solve_csp_of_cag(cag, fixed_grid)
 
-def build_circles_adjacency_graph(center_points, img_pxls, save_frame):
-    ''' Build the CirclesAdjacencyGraph from the given center_points.
+
+def solve_regions(region_points, mask, plate, snapshots=None, fixed_circles=()):
+    ''' 
+    Build and solve the CirclesAdjacencyGraph of each region of the plate. The circles of a
+    region never cross its boundary, so the regions do not depend on each other and are
+    solved at the same time, on a pool of threads. Within an iteration of the benchmark that
+    runs alongside others (see benchmark.in_parallel_run()), they are solved one at a time.
 
     Parameters:
-        center_points: list[Point]
-        img_pxls: list[color]
-        saveFrame: bool
+        region_points: dict[int, list[Point]] := See generate_random_points().
+        mask: MaskPyramid
+        plate: Plate
+        snapshots: SnapshotWriter | None
+        fixed_circles: list[tuple[float, float, float]] := (x, y, r) of circles that are
+                                                           already placed, e.g. those kept
+                                                           from the background cache. The
+                                                           nodes are solved around them.
 
     Return Value:
-        cag: CirclesAdjacencyGraph
+        solved_cags: list[CirclesAdjacencyGraph] := In the order of get_region_codes().
+    '''
+    codes = get_region_codes()
+    solvers = [RegionSolver(region_points[code], mask, plate, fixed_circles) for code in codes]
+    if benchmark.in_parallel_run():
+        # The other iterations of the benchmark already keep the cores busy.
+        solved_cags = [solver.call() for solver in solvers]
+    else:
+        pool = Executors.newFixedThreadPool(min(len(codes), benchmark.worker_count(0)))
+        try:
+            solved_cags = [future.get() for future in pool.invokeAll(solvers)]
+        finally:
+            pool.shutdown()
+
+    for i, cag in enumerate(solved_cags):
+        draw_circles_adjacency_graph(cag, i == len(solved_cags) - 1, snapshots)
+
+    return solved_cags
+
+
+def solve_regions_by_deadline(region_points, mask, plate, deadline, snapshots=None, fixed_circles=()):
+    ''' 
+    Same as solve_regions() but solves coarser seeds, i.e. fewer random points spread
+    evenly over the plate (see get_seed_level()), if solving all of them is not expected
+    to end by the end of the graph phase of the deadline. The coarsest seeds are solved
+    first to measure how long a seed takes to solve. Their circles are kept, and the
+    other seeds of the finest level expected to be solved in the time left are solved
+    around them. The crevice filling fills the space left by the seeds that were dropped.
+
+    Parameters:
+        region_points: dict[int, list[Point]] := See generate_random_points().
+        mask: MaskPyramid
+        plate: Plate
+        deadline: Deadline
+        snapshots: SnapshotWriter | None
+        fixed_circles: list[tuple[float, float, float]] := See solve_regions().
+
+    Return Value:
+        solved_cags: list[CirclesAdjacencyGraph] := The CAGs of the coarsest seeds, then
+                                                     those of the finer seeds, if any.
+    '''
+    levels = [get_seeds_up_to_level(region_points, plate, level) for level in range(const.DEADLINE_SEED_LEVELS)]
+    seed_counts = [sum([len(points) for points in seeds.values()]) for seeds in levels]
+
+    start_time = time.time()
+    solved_cags = solve_regions(levels[0], mask, plate, None, fixed_circles)
+    seconds_per_seed = (time.time() - start_time) / max(1, seed_counts[0])
+
+    solved_level = 0
+    for level in range(len(levels) - 1, 0, -1):
+        if (seed_counts[level] - seed_counts[0]) * seconds_per_seed <= deadline.remaining():
+            coarse_circles = [node.center.get_coord() + (node.radius,)
+                              for cag in solved_cags for node in cag.nodes if node.radius > 0]
+            finer_points = dict([(code, [p for p in points if get_seed_level(p, plate) > 0])
+                                 for code, points in levels[level].items()])
+            finer_points = drop_covered_points(finer_points, coarse_circles)
+            solved_cags = solved_cags + solve_regions(finer_points, mask, plate, snapshots,
+                                                      list(fixed_circles) + coarse_circles)
+            solved_level = level
+            break
+
+    if solved_level < len(levels) - 1:
+        deadline.note('solved {} of the {} seeds'.format(seed_counts[solved_level], seed_counts[-1]))
+
+    return solved_cags
+
+
+def get_seed_level(p, plate):
+    ''' 
+    Return the level of a random point, given by the box of generate_random_points() it is in.
+    Level 0 has the points of every 2**(DEADLINE_SEED_LEVELS - 1)-th box along both axes, level 1
+    adds those of every 2**(DEADLINE_SEED_LEVELS - 2)-th box, and so on, so that the points up to
+    any level are spread evenly over the plate.
+    '''
+    x, y = p.get_coord()
+    i = (x - plate.x_start) // GBIPG_CONST.BOX_SIZE
+    j = (y - plate.y_start) // GBIPG_CONST.BOX_SIZE
+    for level in range(const.DEADLINE_SEED_LEVELS - 1):
+        step = 2**(const.DEADLINE_SEED_LEVELS - 1 - level)
+        if i % step == 0 and j % step == 0:
+            return level
+
+    return const.DEADLINE_SEED_LEVELS - 1
+
+
+def get_seeds_up_to_level(region_points, plate, level):
+    ''' Return the random points of each region whose level is at most level (see get_seed_level()).'''
+    return dict([(code, [p for p in points if get_seed_level(p, plate) <= level])
+                 for code, points in region_points.items()])
+
+
+def merge_solved_cags(solved_cags, fixed_circles=()):
+    ''' 
+    Return the solved nodes of the CAGs of every region as circles. A circle can still
+    overlap a circle of another region by less than a pixel, as the region boundary lies
+    between pixels. Such a circle is shrunk to touch the circle of the region before it.
+
+    Parameters:
+        solved_cags: list[CirclesAdjacencyGraph]
+        fixed_circles: list[tuple[float, float, float]] := See solve_regions(). They
+                                                           are background circles and
+                                                           come first.
+
+    Return Value:
+        circles: list[tuple[int, int, float, int]] := (x, y, r, code) of each node, where
+                                                      code is the mask code of its region.
     '''
-    cag = CirclesAdjacencyGraph(center_points, img_pxls, GBIPG_CONST)
+    grid = CircleGrid(2*GBIPG_CONST.MAX_CIRCLE_RADIUS)
+    circles = []
+    for x, y, r in fixed_circles:
+        grid.add(x, y, r)
+        circles.append((x, y, r, const.MASK_BG_CODE))
+
+    for cag in solved_cags:
+        for node in cag.nodes:
+            cx, cy = node.center.get_coord()
+            if node.radius > 0:
+                # The nodes of the same region never overlap, so only those of other
+                # regions can lower the radius.
+                node.radius = max(0.0, grid.clearance(cx, cy, node.radius))
+                if node.radius > 0:
+                    grid.add(cx, cy, node.radius)
+
+            circles.append((cx, cy, node.radius, node.center.mask_code()))
+
+    return circles
+
+
+def draw_circles_adjacency_graph(cag, save_frame, snapshots=None):
+    ''' Draw the nodes and edges of a CirclesAdjacencyGraph, if the states are saved.
+
+    Parameters:
+        cag: CirclesAdjacencyGraph
+        save_frame: bool := Save the canvas as step 2 afterwards.
+        snapshots: SnapshotWriter | None
 
-    if GBIPG_CONST.SAVE_STATES:
+    Return Value:
+        None
+    '''
+    if GBIPG_CONST.SAVE_STATES and snapshots:
         noStroke()
         r = GBIPG_CONST.MIN_CIRCLE_RADIUS
-        fig_colr = rand.choice(GBIPG_CONST.FIG_COLOR_SCHEME)
-        bg_colr = rand.choice(GBIPG_CONST.BG_COLOR_SCHEME)
+        schemes = get_color_schemes()
+        # One color per region, and the background color for the edges of the figures.
+        colrs = dict([(code, scheme.pick()) for code, scheme in schemes.items()])
+        bg_colr = colrs[const.MASK_BG_CODE]
+        fig_colr = colrs[const.MASK_FIG_CODE]
         for node in cag.nodes:
-            fill(fig_colr if node.center.in_fig() else bg_colr)
+            fill(colrs[node.center.mask_code()])
             cx, cy = node.center.get_coord()
             ellipse(cx, cy, 2*r, 2*r)
 
-        for node in cag.nodes:
-            stroke(bg_colr if node.center.in_fig() else fig_colr)
-            fill(bg_colr if node.center.in_fig() else fig_colr)
+        for i, node in enumerate(cag.nodes):
+            edge_colr = bg_colr if node.center.in_fig() else fig_colr
+            stroke(edge_colr)
+            fill(edge_colr)
             cx, cy = node.center.get_coord()
-            for indx in node.adj_nodes:
+            for indx in cag.adjacent(i):
                 node2 = cag.nodes[indx]
                 cx2, cy2 = node2.center.get_coord()
                 line(cx, cy, cx2, cy2)
                 ellipse(cx, cy, r, r)
 
         if save_frame:
-            img_name = GBIPG_CONST.FILE_NAME.rstrip(".png") + "-step2.png"
-            saveFrame(img_name)
+            snapshots.save(utils.output_file_name(GBIPG_CONST.FILE_NAME, '-step2.png'))
             background(const.WHITE_RGB)
 
-    return cag
 
-
-def solve_csp_of_cag(cag, color_scheme):
+def solve_csp_of_cag(cag, fixed_grid):
     ''' Solve the Constraint Satisfaction Problem of the Circles Adjacency Graph cag.
 
+    The nodes are solved in the order of cag.nodes: each node gets the largest radius
+    that does not overlap the nodes before it. Instead of solving one node at a time,
+    each round solves every node whose conflicting nodes (see get_conflict_edges())
+    before it are all solved. These nodes are never in conflict with each other, so
+    their radii are set at once and then used to lower the max_radius of the nodes
+    after them in a single pass over the conflict edges. This gives the same radii as
+    solving the nodes one at a time, in far fewer passes.
+
     Params:
         cag: CirclesAdjacencyGraph
-        color_scheme: list[str] := list of color hex strings that will be used as argument to fill().
+        fixed_grid: CircleGrid := Circles that are already placed, e.g. the solved
+                                  nodes of another CAG. The solved nodes are added to it.
 
     Return Value:
         solved_cag: CirclesAdjacencyGraph := This is cag but with the radius of each of its node
                                              satisfying the CSP of cag.
     '''
-    noStroke()
-    for i in range(len(cag.nodes)):
-        loadPixels()
-        cag.nodes[i].radius = min(GBIPG_CONST.MAX_CIRCLE_RADIUS, utils.nearest_other_colored_pixel(cag.nodes[i], pixels))
-        cx, cy = cag.nodes[i].center.get_coord()
-        for indx in cag.nodes[i].adj_nodes:
-            cx2, cy2 = cag.nodes[indx].center.get_coord()
-            other_node_new_max_radius = utils.distance(
-                (cx, cy), (cx2, cy2)) - cag.nodes[i].radius
-            if other_node_new_max_radius < cag.nodes[indx].max_radius:
-                cag.nodes[indx].max_radius = other_node_new_max_radius
-                cag.nodes[indx].adj_nodes.remove(i)
-
-        fill(rand.choice(color_scheme))
-        r = cag.nodes[i].radius
-        ellipse(cx, cy, 2*r, 2*r)
+    nodes = cag.nodes
+    max_radii = array('d')
+    for node in nodes:
+        cx, cy = node.center.get_coord()
+        max_radius = min(GBIPG_CONST.MAX_CIRCLE_RADIUS, node.max_radius)
+        max_radii.append(fixed_grid.clearance(cx, cy, max_radius))
+
+    offsets, targets, distances = cag.get_conflict_edges(max_radii, 2*GBIPG_CONST.MAX_CIRCLE_RADIUS)
+
+    # Number of unsolved conflicting nodes before each node.
+    pending = array('i', [0]) * len(nodes)
+    for j in targets:
+        pending[j] += 1
+
+    radii = array('d', [0.0]) * len(nodes)
+    solvable = [i for i in range(len(nodes)) if pending[i] == 0]
+    while solvable:
+        for i in solvable:
+            radii[i] = max(0.0, max_radii[i])
+
+        next_solvable = []
+        for i in solvable:
+            for k in range(offsets[i], offsets[i + 1]):
+                j = targets[k]
+                max_radii[j] = min(max_radii[j], distances[k] - radii[i])
+                pending[j] -= 1
+                if pending[j] == 0:
+                    next_solvable.append(j)
+
+        solvable = next_solvable
+
+    for i, node in enumerate(nodes):
+        node.max_radius = max_radii[i]
+        node.radius = radii[i]
+        if node.radius > 0:
+            cx, cy = node.center.get_coord()
+            fixed_grid.add(cx, cy, node.radius)
 
     solved_cag = cag
 
     return solved_cag
 
-def display_final_nodes(fig_nodes, bg_nodes):
+def display_circles(circles, renderer, snapshots=None):
     '''Display on the canvas the output of the GBIPG algorithm.
 
+    The colors of all the circles are picked first (see palette.assign_colors()),
+    then the circles are drawn together by the renderer.
+
     Parameters:
-        fig_nodes: list[Node]
-        bg_nodes: list[Node]
+        circles: list[tuple[float, float, float, int]] := (x, y, r, code) of each circle.
+        renderer: CircleRenderer
+        snapshots: SnapshotWriter | None
 
-    Return Value:
-        filled_area: float
+    Yields:
+        (x, y, r, colr): tuple[float, float, float, color] := Each circle drawn.
     '''
-    background(const.WHITE_RGB)
-    noStroke()
+    colors = assign_colors([circle[3] for circle in circles], get_color_schemes())
 
-    filled_area = 0
-    for node in fig_nodes:
-        fill(rand.choice(GBIPG_CONST.FIG_COLOR_SCHEME))
-        cx, cy = node.center.get_coord()
-        r = node.radius
-        ellipse(cx, cy, 2*r, 2*r)
-        filled_area += math.pi * r**2
+    renderer.clear(const.WHITE_RGB)
+    for circle, colr in zip(circles, colors):
+        renderer.add(circle[0], circle[1], circle[2], colr)
+    renderer.flush()
 
-    for node in bg_nodes:
-        fill(rand.choice(GBIPG_CONST.BG_COLOR_SCHEME))
-        cx, cy = node.center.get_coord()
-        r = node.radius
-        ellipse(cx, cy, 2*r, 2*r)
-        filled_area += math.pi * r**2
+    for circle, colr in zip(circles, colors):
+        yield (circle[0], circle[1], circle[2], colr)
 
-    if GBIPG_CONST.SAVE_STATES:
-        img_name = GBIPG_CONST.FILE_NAME.rstrip(".png") + "-step3.png"
-        saveFrame(img_name)
+    if GBIPG_CONST.SAVE_STATES and snapshots:
+        snapshots.save(utils.output_file_name(GBIPG_CONST.FILE_NAME, '-step3.png'))
 
-    return filled_area
+def fill_up_crevices(mask, plate, circles, monitor, renderer, settled=0):
+    '''Fill up remaining crevices with the largest circles that fit in them.
 
-def fill_up_crevices(img_pxls, already_filled_area):
-    '''Fill up remaining crevices using Monte Carlo algorithm.
+    The crevices are the gaps between three neighbouring circles or between two
+    neighbouring circles and the wall. Each is filled with the circle tangent to
+    its sides, shrunk if needed so that it does not cross the figure boundary
+    (see gapfill.GapFiller).
     
     Parameters:
-        img_pxls: list[color]
-        already_filled_area: float
-
-    Return Value:
-        None
+        mask: MaskPyramid
+        plate: Plate
+        circles: list[tuple[float, float, float]] := (x, y, r) of the circles
+                                                      already on the canvas.
+        monitor: ConvergenceMonitor := Started with the area already filled.
+                                       The filling stops early if it says so.
+        renderer: CircleRenderer := The circles are added to it, to be drawn
+                                    when it is flushed.
+        settled: int := See finish_plate().
+
+    Yields:
+        (x, y, r, colr): tuple[float, float, float, color] := Each circle placed.
     '''
-    start = GBIPG_CONST.WIDTH/2 - GBIPG_CONST.WALL_RADIUS
-    end = GBIPG_CONST.WIDTH/2 + GBIPG_CONST.WALL_RADIUS
-
-    total_area = math.pi * GBIPG_CONST.WALL_RADIUS**2
-    max_filled_area = total_area * GBIPG_CONST.MAX_FILLED_AREA_RATIO
-
-    for _ in range(1000):
-        loadPixels()
-        x, y = int(rand.uniform(start, end-1)), int(rand.uniform(start, end-1))
-        p = Point(x, y, img_pxls, GBIPG_CONST)
-        r = 10
-        overlap = False
-
-        if p.will_overlap_wall():
-            overlap = True
-        
-        if p.will_overlap_something(r, pixels):
-            overlap = True
-
-        if not overlap:
-            color_scheme = GBIPG_CONST.FIG_COLOR_SCHEME if p.in_fig() else GBIPG_CONST.BG_COLOR_SCHEME
-            fill(rand.choice(color_scheme))
-            ellipse(x, y, 2*r, 2*r)
-            already_filled_area += math.pi * r**2
-
-    if GBIPG_CONST.MIN_CIRCLE_RADIUS > 1:
-        radius_choices = [3, 5]
-    else: radius_choices = [1]
-
-    while already_filled_area < max_filled_area:
-        loadPixels()
-        x, y = int(rand.uniform(start, end-1)), int(rand.uniform(start, end-1))
-        p = Point(x, y, img_pxls, GBIPG_CONST)
-        r = rand.choice(radius_choices)
-        overlap = False
-
-        if p.will_overlap_wall():
-            overlap = True
-        
-        if p.will_overlap_something(r, pixels):
-            overlap = True
-
-        if not overlap:
-            color_scheme = GBIPG_CONST.FIG_COLOR_SCHEME if p.in_fig() else GBIPG_CONST.BG_COLOR_SCHEME
-            fill(rand.choice(color_scheme))
-            ellipse(x, y, 2*r, 2*r)
-            already_filled_area += math.pi * r**2
-
-    if GBIPG_CONST.SAVE_STATES:
-        img_name = GBIPG_CONST.FILE_NAME.rstrip(".png") + "-step4.png"
-        saveFrame(img_name)
\ No newline at end of file
+    max_filled_area = plate.area * GBIPG_CONST.MAX_FILLED_AREA_RATIO
+    gap_filler = get_gap_filler(mask, plate, circles)
+
+    schemes = get_color_schemes()
+    for x, y, r, code in gap_filler.fill(monitor, max_filled_area, settled):
+        colr = schemes[code].pick()
+        renderer.add(x, y, r, colr)
+        yield (x, y, r, colr)
+
+    monitor.finish()
+
+def get_gap_filler(mask, plate, circles):
+    ''' Return a GapFiller of the crevices between the given (x, y, r) circles.'''
+    grid = CircleGrid(2*GBIPG_CONST.MAX_CIRCLE_RADIUS)
+    for x, y, r in circles:
+        if r > 0:
+            grid.add(x, y, r)
+
+    min_radius = 3 if GBIPG_CONST.MIN_CIRCLE_RADIUS > 1 else 1
+    return GapFiller(grid, mask, plate, min_radius, GBIPG_CONST.MAX_CIRCLE_RADIUS, GBIPG_CONST.BOX_SIZE)
@@ -1,22 +1,49 @@
+import threading
+
+from mask import MaskPyramid
+from plate import Plate
+from rawmask import RawMask, write_raw_mask
 import const
 import utils
 
+# The last MaskPyramid built by getMaskPyramid(), as (img, ModelConst, mask).
+_last_mask = (None, None, None)
+_mask_lock = threading.Lock()
+
+# Plates built by getPlate(), by the parameters they were built from. They are
+# shared by the runs of the benchmark mode, which run on several threads.
+_plates = {}
+_plates_lock = threading.Lock()
+
 
 def getImage(file_name, ModelConst, preprocess=True):
     ''' 
     Preprocess (if specified) given image file and return a PImage object.
     If an error occurred during the preprocessing, this returns None.
 
+    A raw mask file (see rawmask.py) is memory-mapped and returned as a RawMask
+    instead. It is already black-and-white so it is never preprocessed, and it
+    must have the same size as the canvas.
+
     Parameters:
         file_name: str := Name of the image file. Must be stored in the 'data'
-                          folder and must be in PNG format.
+                          folder and must be in PNG or raw mask format.
         ModelConst: GBIPG_CONST | MC_CONST
         preprocess: boolean := If True, preprocessImage() will be called on the 
                                loaded image. Initially set to True.
 
     Return Value:
-        PImage | None
+        PImage | RawMask | None
     '''
+    if file_name.endswith('.mask'):
+        img = RawMask(dataPath(file_name))
+        if img.width != ModelConst.WIDTH or img.height != ModelConst.HEIGHT:
+            print("Error: The raw mask's size ({}x{}) is not the size of the canvas.".format(
+                img.width, img.height))
+            return None
+
+        return img
+
     img = loadImage(file_name)
 
     if not img:
@@ -28,6 +55,87 @@ def getImage(file_name, ModelConst, preprocess=True):
     return img
 
 
+def getMaskPyramid(img, ModelConst):
+    ''' 
+    Return the MaskPyramid of a PImage or RawMask. Building the pyramid visits
+    every pixel, so the pyramid of the last image is kept and returned again
+    for the same image, e.g. to each iteration of the benchmark mode.
+    '''
+    global _last_mask
+
+    with _mask_lock:
+        last_img, last_const, mask = _last_mask
+        if last_img is not None and last_img == img and last_const is ModelConst:
+            return mask
+
+        if isinstance(img, RawMask):
+            mask = MaskPyramid(img.pixels, ModelConst, img.codes)
+            # The mapping of the file stays valid once the file is closed.
+            img.close()
+        else:
+            mask = MaskPyramid(img.pixels, ModelConst)
+
+        _last_mask = (img, ModelConst, mask)
+        return mask
+
+
+def saveRawMask(img, ModelConst):
+    ''' 
+    Save a preprocessed PImage as a raw mask file in the 'data' folder, next to
+    the image file of ModelConst.
+
+    Parameters:
+        img: PImage
+        ModelConst: GBIPG_CONST | MC_CONST
+
+    Return Value:
+        file_name: str := Name of the raw mask file.
+    '''
+    file_name = utils.output_file_name(ModelConst.FILE_NAME, '.mask')
+    img.loadPixels()
+    write_raw_mask(dataPath(file_name), img.pixels, img.width, img.height)
+    return file_name
+
+
+def getOutlinePixels(ModelConst):
+    ''' 
+    Return the pixels of the preprocessed plate outline image of ModelConst,
+    or None if the default circular plate is used.
+
+    Parameters:
+        ModelConst: GBIPG_CONST | MC_CONST
+
+    Return Value:
+        list[color] | None
+    '''
+    if not ModelConst.OUTLINE:
+        return None
+
+    outline = getImage(ModelConst.OUTLINE, ModelConst, True)
+    return outline.pixels
+
+
+def getPlate(ModelConst, max_dist):
+    ''' 
+    Return the Plate of ModelConst. A Plate only depends on the plate parameters,
+    so it is built once and reused by every later run with the same parameters,
+    e.g. by each iteration of the benchmark mode.
+
+    Parameters:
+        ModelConst: GBIPG_CONST | MC_CONST
+        max_dist: int | float := See Plate.
+
+    Return Value:
+        Plate
+    '''
+    key = (ModelConst.WIDTH, ModelConst.HEIGHT, ModelConst.WALL_RADIUS, ModelConst.OUTLINE, max_dist)
+    with _plates_lock:
+        if key not in _plates:
+            _plates[key] = Plate(ModelConst, max_dist, getOutlinePixels(ModelConst))
+
+        return _plates[key]
+
+
 def preprocessImage(img, ModelConst):
     ''' Preprocess the given image. 
 
@@ -35,8 +143,11 @@ def preprocessImage(img, ModelConst):
         - Resize image to the size of the canvas (WIDTH, HEIGHT).
         - Turn the image into a pure black-and-white image.
 
-    If there are non-black-and-white pixels, they will be converted to grayscale
-    and then converted to black or white which depends on the GRAYSCALE_THRESHOLD.
+    If there are non-black-and-white pixels, they will be snapped to the
+    mask_color of the nearest extra figure region if it is within
+    REGION_COLOR_TOLERANCE, since resizing blends the pixels of a region with
+    their neighbours. The other pixels are converted to grayscale and then
+    converted to black or white which depends on the GRAYSCALE_THRESHOLD.
 
     Parameter:
         img: PImage := The image to be preprocessed.
@@ -48,20 +159,41 @@ def preprocessImage(img, ModelConst):
     img.resize(ModelConst.WIDTH, ModelConst.HEIGHT)
     img.loadPixels()
 
+    # Each color is converted once, as an image has few distinct colors.
+    converted = {}
     for i, p_color in enumerate(img.pixels):
-        if p_color in [const.WHITE_RGB, const.BLACK_RGB]:
+        if p_color in [const.WHITE_RGB, const.BLACK_RGB] or p_color in ModelConst.REGION_CODES:
             continue
-        else:
-            r, g, b = (0.0, 0.0, 0.0)
-            if utils.is_grayscale(p_color):
-                r, g, b = utils.get_rgb(p_color)
-            else:
-                r, g, b = naive_grayscale(p_color)
-
-            if r + g + b < const.GRAYSCALE_THRESHOLD * 3:
-                img.pixels[i] = const.BLACK_RGB
-            else:
-                img.pixels[i] = const.WHITE_RGB
+
+        if p_color not in converted:
+            converted[p_color] = convert_color(p_color, ModelConst)
+        img.pixels[i] = converted[p_color]
+
+
+def convert_color(colr, ModelConst):
+    '''
+    Return the color that a pixel of the given color, which is neither black,
+    white nor a region's mask_color, has in the preprocessed image (see
+    preprocessImage()).
+    '''
+    r, g, b = utils.get_rgb(colr)
+    nearest, nearest_diff = None, None
+    for mask_colr in ModelConst.REGION_CODES:
+        r2, g2, b2 = utils.get_rgb(mask_colr)
+        diff = abs(r - r2) + abs(g - g2) + abs(b - b2)
+        if diff <= const.REGION_COLOR_TOLERANCE and (nearest is None or diff < nearest_diff):
+            nearest, nearest_diff = mask_colr, diff
+
+    if nearest is not None:
+        return nearest
+
+    if not utils.is_grayscale(colr):
+        r, g, b = naive_grayscale(colr)
+
+    if r + g + b < const.GRAYSCALE_THRESHOLD * 3:
+        return const.BLACK_RGB
+    else:
+        return const.WHITE_RGB
 
 
 def naive_grayscale(colr):
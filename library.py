@@ -0,0 +1,307 @@
+import hashlib
+import json
+import math
+import os
+from array import array
+
+from classes import CircleGrid
+import const
+
+# Number of cells per side of the grid of a mask signature, and of samples per
+# side of each cell.
+SIGNATURE_GRID_SIZE = 16
+SIGNATURE_CELL_SAMPLES = 4
+
+LIBRARY_INDEX_FILE_NAME = 'index.json'
+BACKGROUND_FILE_NAME = 'background-{}.bin'
+
+
+def mask_signature(mask, bounds):
+    '''
+    Return a compact signature of a mask that does not depend on the size or
+    the position of the figure: the bounding box of the figure (see
+    MaskPyramid.figure_bounds()) is divided into a grid, and each cell of the
+    grid holds the number of samples in it that are on the figure or on an
+    extra figure region.
+
+    Parameters:
+        mask: MaskPyramid
+        bounds: tuple[int, int, int, int] := (x0, y0, x1, y1) of the bounding box.
+
+    Return Value:
+        signature: list[int]
+    '''
+    n = SIGNATURE_GRID_SIZE * SIGNATURE_CELL_SAMPLES
+    signature = [0] * (SIGNATURE_GRID_SIZE * SIGNATURE_GRID_SIZE)
+    x0, y0, x1, y1 = bounds
+
+    for sy in range(n):
+        y = y0 + (sy + 0.5) * (y1 - y0) / n
+        for sx in range(n):
+            x = x0 + (sx + 0.5) * (x1 - x0) / n
+            if mask.region_at(min(x, mask.width - 1), min(y, mask.height - 1)) != const.MASK_BG_CODE:
+                cell = SIGNATURE_GRID_SIZE*(sy // SIGNATURE_CELL_SAMPLES) + sx // SIGNATURE_CELL_SAMPLES
+                signature[cell] += 1
+
+    return signature
+
+
+def signature_distance(signature1, signature2):
+    ''' Fraction of the samples of two mask signatures that differ, between 0.0 and 1.0.'''
+    total = len(signature1) * SIGNATURE_CELL_SAMPLES**2
+    return float(sum([abs(a - b) for a, b in zip(signature1, signature2)])) / total
+
+
+def fit_layout(circles, bounds, new_bounds, mask, plate, min_radius, max_radius):
+    '''
+    Fit a stored layout on a new mask and plate: the circles are moved and
+    scaled so that the bounding box of the figure of the layout lands on the
+    bounding box of the new figure, then each is shrunk so that it does not
+    cross the wall or the figure boundary. Circles that would become smaller
+    than min_radius are dropped. The same scale is used on both axes, so
+    moving, scaling and shrinking never make two circles overlap.
+
+    Parameters:
+        circles: list[tuple[float, float, float]] := (x, y, r) of each circle.
+        bounds: tuple[int, int, int, int] := Bounding box of the figure of the layout.
+        new_bounds: tuple[int, int, int, int] := Bounding box of the new figure.
+        mask: MaskPyramid
+        plate: Plate
+        min_radius: float
+        max_radius: float
+
+    Return Value:
+        fitted: list[tuple[float, float, float, int]] := (x, y, r, code) of each
+                                                         circle that was kept.
+    '''
+    x0, y0, x1, y1 = bounds
+    nx0, ny0, nx1, ny1 = new_bounds
+    scale = math.sqrt(float((nx1 - nx0) * (ny1 - ny0)) / ((x1 - x0) * (y1 - y0)))
+    cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+    ncx, ncy = (nx0 + nx1) / 2.0, (ny0 + ny1) / 2.0
+
+    fitted = []
+    for x, y, r in circles:
+        x, y = ncx + (x - cx)*scale, ncy + (y - cy)*scale
+        r = min(r*scale, max_radius, plate.wall_distance(x, y))
+        if r < min_radius:
+            continue
+
+        code = mask.region_at(x, y)
+        r = mask.nearest_opposite_distance(x, y, code, r)
+        if r >= min_radius:
+            fitted.append((x, y, r, code))
+
+    return fitted
+
+
+def cut_out_figure(circles, mask, reach):
+    '''
+    Fit a background layout (see BackgroundCache) on a new mask: the circles
+    that cross the figure or an extra figure region are cut out, so that only
+    the space around the figure, up to a circle's width from its boundary, is
+    left to be filled. The kept circles that are farther than reach from every
+    circle that was cut out are settled: the gaps between them need not be
+    filled again.
+
+    Parameters:
+        circles: list[tuple[float, float, float]] := (x, y, r) of each circle.
+        mask: MaskPyramid
+        reach: float
+
+    Return Value:
+        (settled, border): tuple[list[tuple[float, float, float]], list[tuple[float, float, float]]]
+                           := The settled circles and the other kept circles.
+    '''
+    kept = []
+    cut_grid = CircleGrid(reach)
+    for x, y, r in circles:
+        if mask.region_at(x, y) == const.MASK_BG_CODE and not mask.opposite_in_circle(
+                x, y, const.MASK_BG_CODE, r):
+            kept.append((x, y, r))
+        else:
+            cut_grid.add(x, y, r)
+
+    settled, border = [], []
+    for x, y, r in kept:
+        if cut_grid.clearance(x, y, reach) < reach:
+            border.append((x, y, r))
+        else:
+            settled.append((x, y, r))
+
+    return settled, border
+
+
+def read_circles(path):
+    ''' Return the (x, y, r) circles of a layout file written with write_circles().'''
+    values = array('d')
+    layout_file = open(path, 'rb')
+    values.fromfile(layout_file, os.path.getsize(path) // values.itemsize)
+    layout_file.close()
+    return [tuple(values[i:i + 3]) for i in range(0, len(values), 3)]
+
+
+def file_digest(path):
+    ''' Return the MD5 digest of the contents of a file, so that a key changes with the file.'''
+    data_file = open(path, 'rb')
+    digest = hashlib.md5(data_file.read()).hexdigest()
+    data_file.close()
+    return digest
+
+
+def write_circles(path, circles):
+    ''' Write the (x, y, r) of each circle in a layout file.'''
+    values = array('d')
+    for circle in circles:
+        values.extend(circle[:3])
+
+    layout_file = open(path, 'wb')
+    values.tofile(layout_file)
+    layout_file.close()
+
+
+class LayoutLibrary:
+    '''
+    A library of previously generated layouts (the position and radius of
+    each circle of a plate), stored on the disk so that a plate whose mask is
+    close to the mask of a stored layout can reuse it instead of being
+    generated from scratch.
+
+    Each layout is stored with a key made of the parameters it was generated
+    with, the mask_signature() of its mask and the bounding box of its figure,
+    which gives the offset and the scale to fit the layout on another figure
+    (see fit_layout()). When the library holds more than
+    max_entries layouts, the least recently used ones are removed.
+
+    Attributes:
+        directory: str
+        max_entries: int
+        entries: list[dict] := The index of the library.
+        lookups: int := Number of calls to find() so far, over all runs.
+        hits: int := Number of calls to find() that found a layout.
+    '''
+
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = []
+        self.lookups = 0
+        self.hits = 0
+        self._clock = 0
+        self._next_id = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        index_path = os.path.join(directory, LIBRARY_INDEX_FILE_NAME)
+        if os.path.exists(index_path):
+            index_file = open(index_path)
+            index = json.load(index_file)
+            index_file.close()
+
+            self.entries = index['entries']
+            self.lookups = index['lookups']
+            self.hits = index['hits']
+            self._clock = index['clock']
+            self._next_id = index['next_id']
+
+    def find(self, key, signature, max_distance):
+        '''
+        Return the entry of the stored layout with the same key whose signature
+        is closest to the given signature, or None if none is within
+        max_distance (see signature_distance()).
+        '''
+        self.lookups += 1
+        best_entry, best_distance = None, None
+        for entry in self.entries:
+            if entry['key'] != key:
+                continue
+
+            distance = signature_distance(entry['signature'], signature)
+            if distance <= max_distance and (best_entry is None or distance < best_distance):
+                best_entry, best_distance = entry, distance
+
+        if best_entry is not None:
+            self.hits += 1
+            self._touch(best_entry)
+
+        return best_entry
+
+    def load(self, entry):
+        ''' Return the circles of the layout of an entry, as (x, y, r) tuples.'''
+        return read_circles(os.path.join(self.directory, entry['file']))
+
+    def add(self, key, signature, bounds, circles):
+        ''' Store a layout, evicting the least recently used ones if needed.'''
+        file_name = 'layout-{}.bin'.format(self._next_id)
+        self._next_id += 1
+        write_circles(os.path.join(self.directory, file_name), circles)
+
+        entry = {'key': key, 'signature': signature, 'bounds': list(bounds), 'file': file_name}
+        self._touch(entry)
+        self.entries.append(entry)
+
+        while len(self.entries) > self.max_entries:
+            oldest = min(self.entries, key=lambda e: e['last_used'])
+            self.entries.remove(oldest)
+            os.remove(os.path.join(self.directory, oldest['file']))
+
+    def save(self):
+        ''' Save the index of the library. Call this after find() and add().'''
+        index = {'entries': self.entries, 'lookups': self.lookups, 'hits': self.hits,
+                 'clock': self._clock, 'next_id': self._next_id}
+        index_file = open(os.path.join(self.directory, LIBRARY_INDEX_FILE_NAME), 'w')
+        json.dump(index, index_file)
+        index_file.close()
+
+    def hit_rate(self):
+        return float(self.hits) / self.lookups if self.lookups else 0.0
+
+    def summary(self):
+        return 'Layout library: {} layouts, {} hits in {} lookups (hit rate: {:.3f}).'.format(
+            len(self.entries), self.hits, self.lookups, self.hit_rate())
+
+    def _touch(self, entry):
+        self._clock += 1
+        entry['last_used'] = self._clock
+
+
+class BackgroundCache:
+    '''
+    A cache, stored on the disk, of the layout of a plate solved as if it had
+    no figure, one per set of plate parameters (see load()). Away from the
+    figure, the circles of a plate do not depend on the figure, so a plate can
+    keep the cached circles that are far from its figure (see cut_out_figure())
+    and only solve the space around the figure. The cache is kept across runs,
+    so that generating plates for many figures solves the background once.
+
+    Attributes:
+        directory: str
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def load(self, key):
+        '''
+        Return the (x, y, r) circles of the background solved with the given
+        parameters, or None if it is not in the cache.
+
+        Parameters:
+            key: list := The parameters that the background depends on, e.g.
+                         the size of the canvas, the wall and the circles.
+        '''
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+
+        return read_circles(path)
+
+    def save(self, key, circles):
+        write_circles(self._get_path(key), circles)
+
+    def _get_path(self, key):
+        digest = hashlib.md5(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, BACKGROUND_FILE_NAME.format(digest))
@@ -0,0 +1,344 @@
+import math
+
+import const
+import utils
+
+
+class MaskPyramid:
+    '''
+    Multi-resolution view of the black-and-white input image. Level 0 stores
+    one mask code per pixel (see ModelConst.mask_code()), so a pixel of an
+    extra figure region has the code of its region; every coarser level halves the resolution and a
+    cell keeps the code of its pixels if they all agree, or MASK_MIXED_CODE
+    otherwise. Queries start at the coarsest level and only descend into
+    mixed cells, so the pixel work of a query grows with the length of the
+    figure boundary near the query point instead of with the area it covers.
+
+    The pyramid also keeps the boundary band: the cells of size
+    MASK_BAND_CELL_SIZE that are within band_width of a pixel where the mask
+    code changes. A query of radius at most band_width around a point outside
+    of the band is answered from the cell of the point alone, so only the
+    queries near the figure boundary walk the pyramid.
+
+    Building the pyramid visits every pixel, so it is built once per input
+    image (see img.getMaskPyramid()).
+
+    Attributes:
+        width: int
+        height: int
+        levels: list[bytearray] := levels[k] has cells of size 2**k.
+        widths: list[int] := number of cell columns of each level.
+        heights: list[int] := number of cell rows of each level.
+        band_width: int | float := MAX_CIRCLE_RADIUS of ModelConst.
+        band: set[int] := Index of each cell of the band, in its level.
+    '''
+
+    def __init__(self, pxls, ModelConst, codes=None):
+        ''' 
+        Parameters:
+            pxls: list[color] := Pixels of the input image.
+            ModelConst: GBIPG_CONST | MC_CONST
+            codes: list[int] | None := Mask code of each pixel. If given, it is
+                                       used as level 0 as is and pxls is not read.
+        '''
+        self.width = ModelConst.WIDTH
+        self.height = ModelConst.HEIGHT
+        self.levels = [codes if codes is not None else self._get_codes(pxls, ModelConst)]
+        self.widths = [self.width]
+        self.heights = [self.height]
+
+        while (1 << len(self.levels)) <= const.MASK_PYRAMID_TOP_CELL_SIZE:
+            self._add_level()
+
+        self.band_width = ModelConst.MAX_CIRCLE_RADIUS
+        self._band_level = len(bin(const.MASK_BAND_CELL_SIZE)) - 3 # log2 of the cell size
+        self.band = self._get_band()
+
+    def _get_codes(self, pxls, ModelConst):
+        ''' 
+        Return the mask code of each pixel. A row has few distinct colors, so
+        the code of each color of a row is found once, and rows that are all
+        white are skipped.
+        '''
+        w = self.width
+        codes = bytearray(w * self.height)
+        for y in range(self.height):
+            row = pxls[w*y:w*(y + 1)]
+            colors = set(row)
+            if colors == set([const.WHITE_RGB]):
+                continue
+
+            color_codes = dict([(colr, ModelConst.mask_code(colr)) for colr in colors])
+            codes[w*y:w*(y + 1)] = bytearray([color_codes[colr] for colr in row])
+
+        return codes
+
+    def _add_level(self):
+        '''
+        Add the next coarser level. The four pixels of the cells of a row are
+        taken from the two rows below as strided slices, so each chunk of
+        MASK_LEVEL_CHUNK_SIZE cells whose pixels all agree is copied at once.
+        Only the chunks with a mixed cell are built cell by cell.
+        '''
+        prev = self.levels[-1]
+        prev_w, prev_h = self.widths[-1], self.heights[-1]
+        w, h = (prev_w + 1) // 2, (prev_h + 1) // 2
+        cells = bytearray(w * h)
+        chunk_size = const.MASK_LEVEL_CHUNK_SIZE
+
+        for cy in range(h):
+            y0 = 2 * cy
+            y1 = min(y0 + 1, prev_h - 1)
+            top_left, top_right = self._split_row(prev, prev_w, y0)
+            bottom_left, bottom_right = self._split_row(prev, prev_w, y1)
+
+            for start in range(0, w, chunk_size):
+                end = min(start + chunk_size, w)
+                part = top_left[start:end]
+                if top_right[start:end] == part and bottom_left[start:end] == part and bottom_right[start:end] == part:
+                    cells[w*cy + start:w*cy + end] = part
+                    continue
+
+                for cx in range(start, end):
+                    code = top_left[cx]
+                    if top_right[cx] != code or bottom_left[cx] != code or bottom_right[cx] != code:
+                        code = const.MASK_MIXED_CODE
+                    cells[w*cy + cx] = code
+
+        self.levels.append(cells)
+        self.widths.append(w)
+        self.heights.append(h)
+
+    def _split_row(self, cells, w, y):
+        '''
+        Return the cells of row y of a level at even and at odd columns, i.e. the
+        left and right columns of the cells of the next level. If the level has an
+        odd width, its last column is the right column of the last cell as well.
+        '''
+        if isinstance(cells, bytearray):
+            row = cells[w*y:w*(y + 1)]
+        else:
+            # The codes of a RawMask are read from its file one at a time.
+            row = bytearray([cells[w*y + x] for x in range(w)])
+
+        left, right = row[0::2], row[1::2]
+        if len(right) < len(left):
+            right.append(left[-1])
+
+        return left, right
+
+    def _get_band(self):
+        '''
+        Return the cells of the boundary band. A cell is on the boundary if it
+        is mixed or if a cell next to it has another code. Every cell close
+        enough to a boundary cell that a circle of radius band_width around
+        any of its pixels could reach the boundary cell is in the band.
+        '''
+        level = self._band_level
+        cells = self.levels[level]
+        w, h = self.widths[level], self.heights[level]
+
+        boundary = set()
+        for cy in range(h):
+            for cx in range(w):
+                indx = w*cy + cx
+                code = cells[indx]
+                if code == const.MASK_MIXED_CODE:
+                    boundary.add((cx, cy))
+                if cx + 1 < w and cells[indx + 1] != code:
+                    boundary.update([(cx, cy), (cx + 1, cy)])
+                if cy + 1 < h and cells[indx + w] != code:
+                    boundary.update([(cx, cy), (cx, cy + 1)])
+
+        # The pixels within band_width of a pixel are at most this many cells
+        # away from its cell on each axis (the query point is rounded to a pixel).
+        reach = int(self.band_width) // (1 << level) + 2
+
+        band = set()
+        for cx, cy in boundary:
+            for ny in range(max(0, cy - reach), min(h, cy + reach + 1)):
+                for nx in range(max(0, cx - reach), min(w, cx + reach + 1)):
+                    band.add(w*ny + nx)
+
+        return band
+
+    def _in_region_interior(self, x, y, code, r):
+        '''
+        Returns True if the boundary band shows that every pixel within r of
+        (x, y) has the mask code code. False means that the pyramid has to be
+        walked to find out.
+        '''
+        if r > self.band_width:
+            return False
+
+        level = self._band_level
+        px, py = int(round(x)), int(round(y))
+        if px < 0 or py < 0 or px >= self.width or py >= self.height:
+            return False
+
+        # A cell outside of the band is not mixed, so its code is the code of each of its pixels.
+        indx = self.widths[level]*(py >> level) + (px >> level)
+        return indx not in self.band and self.levels[level][indx] == code
+
+    def code_at(self, x, y):
+        '''Returns the mask code of the pixel nearest to (x, y).'''
+        return self.levels[0][self.width*int(round(y)) + int(round(x))]
+
+    def region_at(self, x, y):
+        '''
+        Returns the mask code of the region of the pixel nearest to (x, y), i.e.
+        its mask code, with the pixels of any other color counted as background.
+        '''
+        code = self.code_at(x, y)
+        return const.MASK_BG_CODE if code == const.MASK_OTHER_CODE else code
+
+    def nearest_opposite_distance(self, x, y, code, max_dist):
+        '''
+        Returns the distance between (x, y) and the nearest pixel whose mask
+        code differs from code. If there is no such pixel within max_dist,
+        max_dist is returned. The distance is measured between pixel centers,
+        so it matches a pixel-by-pixel scan of the input image.
+
+        Parameters:
+            x: int | float
+            y: int | float
+            code: int := Mask code of a region, e.g. MASK_FIG_CODE or MASK_BG_CODE.
+            max_dist: int | float
+
+        Return Value:
+            float
+        '''
+        if self._in_region_interior(x, y, code, max_dist):
+            return max_dist
+
+        best_sq = max_dist * max_dist
+        found = False
+        stack = self._get_top_cells(x, y, max_dist)
+
+        while stack:
+            level, cx, cy = stack.pop()
+            cell = self.levels[level][self.widths[level]*cy + cx]
+            if cell == code:
+                continue
+
+            d_sq = self._cell_distance_squared(level, cx, cy, x, y)
+            if d_sq >= best_sq:
+                continue
+
+            if level == 0 or cell != const.MASK_MIXED_CODE:
+                best_sq = d_sq
+                found = True
+            else:
+                self._push_children(stack, level, cx, cy)
+
+        return math.sqrt(best_sq) if found else max_dist
+
+    def opposite_in_circle(self, x, y, code, r):
+        '''
+        Returns True if a pixel whose mask code differs from code lies within
+        the circle with center (x, y) and radius r, i.e. the same pixels a
+        pixel-by-pixel scan of the circle on the input image would find.
+
+        Parameters:
+            x: int | float
+            y: int | float
+            code: int := Mask code of a region, e.g. MASK_FIG_CODE or MASK_BG_CODE.
+            r: int | float
+
+        Return Value:
+            bool
+        '''
+        if self._in_region_interior(x, y, code, r):
+            return False
+
+        r_squared = r * r
+        stack = self._get_top_cells(x, y, r)
+
+        while stack:
+            level, cx, cy = stack.pop()
+            cell = self.levels[level][self.widths[level]*cy + cx]
+            if cell == code:
+                continue
+
+            if self._cell_distance_squared(level, cx, cy, x, y) > r_squared:
+                continue
+
+            if level == 0 or cell != const.MASK_MIXED_CODE:
+                return True
+
+            self._push_children(stack, level, cx, cy)
+
+        return False
+
+    def figure_bounds(self):
+        '''
+        Returns the bounding box of the pixels that are on the figure or on an
+        extra figure region (see region_at()), or None if there are none. The
+        pyramid is walked from its coarsest level, skipping the cells that are
+        background or already inside the box found so far.
+
+        Return Value:
+            (x0, y0, x1, y1): tuple[int, int, int, int] | None := x1 and y1 are
+                                                                  excluded.
+        '''
+        top = len(self.levels) - 1
+        stack = [(top, cx, cy) for cy in range(self.heights[top]) for cx in range(self.widths[top])]
+        bounds = None
+
+        while stack:
+            level, cx, cy = stack.pop()
+            cell = self.levels[level][self.widths[level]*cy + cx]
+            if cell == const.MASK_BG_CODE or cell == const.MASK_OTHER_CODE:
+                continue
+
+            size = 1 << level
+            x0, y0 = cx * size, cy * size
+            x1, y1 = min(x0 + size, self.width), min(y0 + size, self.height)
+            if bounds is not None and bounds[0] <= x0 and bounds[1] <= y0 and x1 <= bounds[2] and y1 <= bounds[3]:
+                continue
+
+            if level == 0 or cell != const.MASK_MIXED_CODE:
+                if bounds is None:
+                    bounds = (x0, y0, x1, y1)
+                else:
+                    bounds = (min(bounds[0], x0), min(bounds[1], y0), max(bounds[2], x1), max(bounds[3], y1))
+            else:
+                self._push_children(stack, level, cx, cy)
+
+        return bounds
+
+    def _get_top_cells(self, x, y, r):
+        top = len(self.levels) - 1
+        size = 1 << top
+        x_start = max(0, int(math.floor((x - r) / size)))
+        y_start = max(0, int(math.floor((y - r) / size)))
+        x_end = min(self.widths[top] - 1, int(math.floor((x + r) / size)))
+        y_end = min(self.heights[top] - 1, int(math.floor((y + r) / size)))
+
+        cells = []
+        for cy in range(y_start, y_end + 1):
+            for cx in range(x_start, x_end + 1):
+                cells.append((top, cx, cy))
+
+        return cells
+
+    def _push_children(self, stack, level, cx, cy):
+        w, h = self.widths[level - 1], self.heights[level - 1]
+        for ccy in range(2 * cy, min(2 * cy + 2, h)):
+            for ccx in range(2 * cx, min(2 * cx + 2, w)):
+                stack.append((level - 1, ccx, ccy))
+
+    def _cell_distance_squared(self, level, cx, cy, x, y):
+        '''
+        Squared distance between (x, y) and the nearest pixel of the cell. The
+        nearest pixel is found per axis since the pixels form a grid.
+        '''
+        size = 1 << level
+        x0, y0 = cx * size, cy * size
+        x1 = min(x0 + size, self.width) - 1
+        y1 = min(y0 + size, self.height) - 1
+
+        nx = min(max(int(round(x)), x0), x1)
+        ny = min(max(int(round(y)), y0), y1)
+
+        return utils.distance_squared((nx, ny), (x, y))
@@ -0,0 +1,105 @@
+from img import saveRawMask
+from raster import RGBImage
+from deadline import get_deadline
+import benchmark
+import profiler
+import utils
+
+
+def run_mode(img, ModelConst, run, run_benchmarked, name, suffix=''):
+    '''
+    Run a model in the mode given by its mode parameter.
+
+    Parameters:
+        img: PImage | RawMask
+        ModelConst: GBIPG_CONST | MC_CONST
+        run: function := run(img, image, deadline) generates a plate, drawn into
+                         image if it is an RGBImage or on the canvas if it is
+                         None, and returns its ConvergenceMonitor.
+        run_benchmarked: function := Same as run(), called by each iteration of
+                                     the benchmark mode.
+        name: str := Name of the algorithm, e.g. 'GBIPG'.
+        suffix: str := Added to the names of the output files of the model
+                       before their own suffix, e.g. '-mc'.
+
+    Return Value:
+        boolean := False if the mode is not supported.
+    '''
+    if ModelConst.MODE == 'normal':
+        normal_mode(img, ModelConst, run, suffix)
+    elif ModelConst.MODE == 'benchmark':
+        benchmark_mode(img, ModelConst, run_benchmarked, name, suffix)
+    elif ModelConst.MODE == 'convert':
+        convert_mode(img, ModelConst)
+    elif ModelConst.MODE == 'headless':
+        headless_mode(img, ModelConst, run, suffix)
+    else:
+        print('Error: Invalid mode.')
+        return False
+
+    return True
+
+
+def normal_mode(img, ModelConst, run, suffix=''):
+    '''Run the algorithm normally.'''
+    print('Program start.')
+    deadline = get_deadline(ModelConst)
+    monitor = profiler.run_profiled(lambda: run(img, None, deadline), ModelConst, ModelConst.FILE_NAME, suffix)
+    report_run(monitor, deadline, ModelConst, suffix)
+    print('Success.')
+
+
+def headless_mode(img, ModelConst, run, suffix=''):
+    '''Run the algorithm without drawing on the canvas: the plate is drawn into
+    an RGBImage (see raster.py), which is then saved as a PNG file. The states
+    and snapshots of the algorithm are not saved, as they are drawn on the canvas.
+    '''
+    print('Program start.')
+    deadline = get_deadline(ModelConst)
+    image = RGBImage(ModelConst.WIDTH, ModelConst.HEIGHT)
+    monitor = profiler.run_profiled(lambda: run(img, image, deadline), ModelConst, ModelConst.FILE_NAME, suffix)
+    report_run(monitor, deadline, ModelConst, suffix)
+
+    file_name = utils.output_file_name(ModelConst.FILE_NAME, suffix + '-plate.png')
+    image.save(savePath(file_name))
+    print('Saved plate to {}.'.format(file_name))
+    print('Success.')
+
+
+def report_run(monitor, deadline, ModelConst, suffix=''):
+    ''' Print how the run converged and how it kept to its deadline.'''
+    print(monitor.summary())
+    if monitor.stop_reason:
+        print('Stopped early: {}.'.format(monitor.stop_reason))
+    if deadline:
+        print(deadline.report())
+    if ModelConst.SAVE_CONVERGENCE:
+        monitor.save_curve(utils.output_file_name(ModelConst.FILE_NAME, suffix + '-convergence.csv'))
+
+
+def convert_mode(img, ModelConst):
+    '''Save the preprocessed input image as a raw mask file.'''
+    print('Program start.')
+    file_name = saveRawMask(img, ModelConst)
+    print('Saved raw mask to data/{}.'.format(file_name))
+    print('Success.')
+
+
+def benchmark_mode(img, ModelConst, run, name, suffix=''):
+    '''Benchmark the algorithm to determine its median runtime and its confidence
+    interval. The iterations are spread over worker threads (see benchmark.py),
+    each drawing its plate into its own RGBImage instead of the canvas.
+    If the deadline is enabled, each iteration gets its own deadline.
+    '''
+    print('Program start.')
+    img.loadPixels()
+
+    def run_headless():
+        run(img, RGBImage(ModelConst.WIDTH, ModelConst.HEIGHT), get_deadline(ModelConst))
+
+    def run_benchmark():
+        benchmark.run_benchmark('{} on {}'.format(name, ModelConst.FILE_NAME), run_headless, ModelConst,
+                                utils.output_file_name(ModelConst.FILE_NAME, suffix + '-benchmark.json'))
+
+    profiler.run_profiled(run_benchmark, ModelConst, ModelConst.FILE_NAME, suffix)
+    print('Success.')
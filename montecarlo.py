@@ -1,10 +1,13 @@
 import math
 import random
-import time
 
 from const import MC_CONST
-from img import getImage
-from classes import Point
+from img import getImage, getPlate, getMaskPyramid
+from classes import Point, CircleGrid
+from convergence import ConvergenceMonitor
+from palette import ColorScheme
+from raster import CircleRenderer
+import modes
 import const
 import utils
 
@@ -15,12 +18,7 @@ def setup():
     if MC_CONST.is_parameters_valid():
         img = getImage(MC_CONST.FILE_NAME, MC_CONST, MC_CONST.PREPROCESS_IMG)
         if img:
-            if MC_CONST.MODE == 'normal':
-                normal_mode(img)
-            elif MC_CONST.MODE == 'benchmark':
-                benchmark_mode(img, MC_CONST.BENCHMARK_ITERATIONS)
-            else:
-                print('Error: Invalid mode.')
+            if not modes.run_mode(img, MC_CONST, run, run, 'Monte Carlo', '-mc'):
                 exit()
         else:
             print('Failed.')
@@ -29,80 +27,90 @@ def setup():
         print('Failed.')
         exit()
 
-def normal_mode(img):
-    '''Run the algorithm normally.
-
-    Parameters:
-        img: PImage
-    '''
-    print('Program start.')
-    run(img)
-    print('Success.')
-
-def benchmark_mode(img, iterations):
-    '''Benchmark the algorithm to determine its average runtime and variance.
-
-    Parameters:
-        img: PImage
-        iterations: int := How many times the algorithm will be run.
-    '''
-    print('Program start.')
-    avg_time = 0.0
-    variance = 0.0
-    duration_list = []
-
-    for i in range(1, iterations+1):
-        start_time = time.time()
-
-        run(img)
-
-        duration = round(time.time() - start_time, 3)
-        duration_list.append(duration)
-        avg_time += duration
-        print('Iteration {} of {}: {} seconds.'
-              .format(i, iterations, duration))
-
-    print('Success.')
-    avg_time = round(avg_time / iterations, 3)
-    variance = round(sum([(duration - avg_time)**2 for duration in duration_list]) / iterations, 3)
-    
-    print('Average runtime: {} seconds'.format(avg_time))
-    print('Variance: {}'.format(variance))
-
-def run(img):
-    background(const.WHITE)
+def run(img, image=None, deadline=None):
+    if deadline:
+        deadline.start_phase('setup')
+    if image is None:
+        background(const.WHITE)
+    else:
+        image.clear(const.WHITE_RGB)
     img.loadPixels()
-    monte_carlo(img.pixels)
+    mask = getMaskPyramid(img, MC_CONST)
+    plate = getPlate(MC_CONST, MC_CONST.MAX_CIRCLE_RADIUS)
+    return monte_carlo(img.pixels, mask, plate, image, deadline)
 
-def monte_carlo(img_pxls):
+def monte_carlo(img_pxls, mask, plate, image=None, deadline=None):
     '''
     Perform the Monte Carlo Algorithm to generate an Ishihara Plate.
-    '''
-    already_filled_area = 0.0
-    total_area = math.pi * MC_CONST.WALL_RADIUS**2
-    MAX_FILLED_AREA = total_area * MC_CONST.MAX_FILLED_AREA_RATIO
 
-    start = MC_CONST.WIDTH//2 - MC_CONST.WALL_RADIUS
-    end = MC_CONST.WIDTH//2 + MC_CONST.WALL_RADIUS
+    A random circle is rejected if its center is outside the wall, if it
+    overlaps an already placed circle, or if it crosses the figure boundary.
+    The placed circles are kept in a CircleGrid so the overlap test only
+    compares the circle with the few placed circles around it.
+
+    The loop stops when max_filled_area_ratio is reached or when the
+    ConvergenceMonitor finds that the acceptance rate or the fill rate fell
+    below their floors.
 
-    noStroke()
-    while already_filled_area < MAX_FILLED_AREA:
-        loadPixels()
-        x, y = random.randint(start, end-1), random.randint(start, end-1)
+    Parameters:
+        img_pxls: list[color]
+        mask: MaskPyramid
+        plate: Plate
+        image: RGBImage | None := The circles are drawn into it instead of
+                                  the canvas, if given.
+        deadline: Deadline | None := The loop also stops at the end of the
+                                     circles phase, if given.
+
+    Return Value:
+        monitor: ConvergenceMonitor
+    '''
+    grid = CircleGrid(2*MC_CONST.MAX_CIRCLE_RADIUS)
+    MAX_FILLED_AREA = plate.area * MC_CONST.MAX_FILLED_AREA_RATIO
+    monitor = ConvergenceMonitor(plate.area, MC_CONST.MIN_ACCEPTANCE_RATE,
+                                 MC_CONST.MIN_FILL_RATE, MC_CONST.CONVERGENCE_WINDOW)
+
+    fig_scheme = ColorScheme(MC_CONST.FIG_COLOR_SCHEME, MC_CONST.LUMINANCE_JITTER)
+    bg_scheme = ColorScheme(MC_CONST.BG_COLOR_SCHEME, MC_CONST.LUMINANCE_JITTER)
+    renderer = CircleRenderer(MC_CONST.WIDTH, MC_CONST.HEIGHT, image)
+
+    end_time = None
+    if deadline:
+        deadline.start_phase('circles')
+        end_time = deadline.end_time()
+        monitor.deadline = end_time
+
+    while monitor.filled_area < MAX_FILLED_AREA and not monitor.should_stop():
+        x, y = random.randint(plate.x_start, plate.x_end-1), random.randint(plate.y_start, plate.y_end-1)
         r = random.randint(MC_CONST.MIN_CIRCLE_RADIUS, MC_CONST.MAX_CIRCLE_RADIUS)
         p = Point(x, y, img_pxls, MC_CONST)
         
         overlap = False
 
-        if p.will_overlap_wall():
+        if p.will_overlap_wall(plate):
             overlap = True
-        
-        if p.will_overlap_something(r, pixels):
+        elif grid.clearance(x, y, r) < r:
+            overlap = True
+        elif mask.opposite_in_circle(x, y, p.mask_code(), r):
             overlap = True
 
         if not overlap:
-            color_scheme = MC_CONST.FIG_COLOR_SCHEME if p.in_fig() else MC_CONST.BG_COLOR_SCHEME
-            fill(random.choice(color_scheme))
-            ellipse(x, y, 2*r, 2*r)
+            grid.add(x, y, r)
+            renderer.add(x, y, r, fig_scheme.pick() if p.in_fig() else bg_scheme.pick())
+
+            # Only the center is checked against the wall, so count only the
+            # part of the circle inside of it.
+            monitor.record(True, plate.clipped_area(x, y, r))
+
+            if end_time is not None:
+                if monitor.accepted % const.DEADLINE_DRAW_BATCH_SIZE == 0:
+                    renderer.flush()
+                # Stop early enough to draw the circles that are not drawn yet by the end of the phase.
+                monitor.deadline = end_time - renderer.flush_time()
+        else:
+            monitor.record(False)
 
-            already_filled_area += math.pi * r**2
\ No newline at end of file
+    renderer.flush()
+    monitor.finish()
+    if deadline:
+        deadline.end_phase()
+    return monitor
\ No newline at end of file
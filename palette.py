@@ -0,0 +1,64 @@
+import bisect
+import random as rand
+
+import utils
+
+
+class ColorScheme:
+    '''
+    The colors that the circles of the figure or of the background can have.
+    Each entry of a color scheme parameter is either a color hex string or a
+    [color hex, weight] pair, and a color is picked with a probability that is
+    proportional to its weight (1 for a plain color hex string). The picked
+    color is then made lighter or darker by a random amount of at most
+    luminance_jitter so that circles of the same color still differ a bit.
+
+    Attributes:
+        colors: list[color]
+        weights: list[float]
+        luminance_jitter: float := Between 0.0 (disabled) and 1.0.
+    '''
+
+    def __init__(self, entries, luminance_jitter=0.0):
+        self.colors = []
+        self.weights = []
+        self.luminance_jitter = luminance_jitter
+
+        for entry in entries:
+            color_hex, weight = utils.color_scheme_entry(entry)
+            self.colors.append(utils.hex_to_color(color_hex))
+            self.weights.append(float(weight))
+
+        self._cumulative_weights = []
+        total = 0.0
+        for weight in self.weights:
+            total += weight
+            self._cumulative_weights.append(total)
+
+    def pick(self):
+        ''' Return a random color of the scheme.'''
+        total = self._cumulative_weights[-1]
+        indx = bisect.bisect_right(self._cumulative_weights, rand.uniform(0, total))
+        colr = self.colors[min(indx, len(self.colors) - 1)]
+
+        if self.luminance_jitter > 0:
+            shift = rand.uniform(-self.luminance_jitter, self.luminance_jitter) * 255
+            r, g, b = utils.get_rgb(colr)
+            colr = color(*[int(round(min(255, max(0, c + shift)))) for c in (r, g, b)])
+
+        return colr
+
+
+def assign_colors(codes, schemes):
+    '''
+    Pick the color of each circle from the color scheme of the region of the
+    mask that it is in.
+
+    Parameters:
+        codes: list[int] := Mask code of the region of each circle's center.
+        schemes: dict[int, ColorScheme] := Color scheme of each region, by mask code.
+
+    Return Value:
+        colors: list[color]
+    '''
+    return [schemes[code].pick() for code in codes]
@@ -0,0 +1,305 @@
+import collections
+import math
+from array import array
+
+import const
+import utils
+
+
+class Plate:
+    '''
+    The region of the canvas that can be filled with circles. By default this
+    is the disk of radius WALL_RADIUS at the center of the canvas, but any
+    outline can be given as an image where black pixels are inside the plate.
+
+    For the default plate, the distance between a point and the wall is
+    computed from the disk itself. For an outline, the nearest pixel outside
+    the plate is stored once for each pixel at most max_dist away from the
+    wall, so checking a circle against the wall costs the same for any
+    outline. These are spread inward from the pixels along the wall, so this
+    work grows with the length of the wall instead of with the plate's area.
+    Reading the outline image itself still visits every pixel, so a Plate
+    should be built once and reused (see img.getPlate()).
+
+    Attributes:
+        width: int
+        height: int
+        max_dist: float := wall_distance() returns at most this value.
+        inside: bytearray := 1 for each pixel inside the plate, else 0.
+        area: int := Number of pixels inside the plate.
+        x_start, x_end, y_start, y_end: int := Bounding box of the plate
+                                               (end is exclusive).
+    '''
+
+    def __init__(self, ModelConst, max_dist, outline_pxls=None):
+        self.width = ModelConst.WIDTH
+        self.height = ModelConst.HEIGHT
+        self.max_dist = max_dist
+        self._circle = None
+
+        if outline_pxls is None:
+            self._circle = (ModelConst.WIDTH/2, ModelConst.HEIGHT/2, ModelConst.WALL_RADIUS)
+            self.inside = self._get_circle_mask(*self._circle)
+        else:
+            self.inside = self._get_outline_mask(outline_pxls)
+
+        self._set_bounds()
+        self._sites = self._get_nearest_sites() if self._circle is None else None
+
+    def contains(self, x, y):
+        ''' Returns True if the pixel nearest to (x, y) is inside the plate.'''
+        px, py = int(round(x)), int(round(y))
+        if not (0 <= px < self.width and 0 <= py < self.height):
+            return False
+
+        return self.inside[self.width*py + px] == 1
+
+    def wall_distance(self, x, y):
+        '''
+        Distance between (x, y) and the wall, clamped to max_dist. It is 0 for
+        points outside of the plate. The wall lies halfway between the pixels
+        inside and outside the plate.
+        '''
+        if not self.contains(x, y):
+            return 0.0
+
+        if self._circle is not None:
+            cx, cy, r = self._circle
+            # The pixels at the edges of the canvas are outside of the plate too.
+            d = min(r - utils.distance((x, y), (cx, cy)), x - 0.5, y - 0.5,
+                    self.width - 1.5 - x, self.height - 1.5 - y)
+            return max(0.0, min(self.max_dist, d))
+
+        site = self._sites[self.width*int(round(y)) + int(round(x))]
+        if site < 0:
+            return self.max_dist
+
+        site_coord = (site % self.width, site // self.width)
+        return min(self.max_dist, utils.distance((x, y), site_coord) - 0.5)
+
+    def wall_circle(self, x, y):
+        '''
+        A circle that matches the wall near (x, y), as (cx, cy, s) with a
+        negative signed radius s (see gapfill.apollonius()). For the default
+        plate this is the wall itself. For an outline, the wall near (x, y) is
+        approximated by its tangent line, i.e. a very large circle. Returns
+        None if (x, y) is more than max_dist away from the wall.
+        '''
+        if self._circle is not None:
+            cx, cy, r = self._circle
+            return (cx, cy, -r)
+
+        if not self.contains(x, y):
+            return None
+
+        site = self._sites[self.width*int(round(y)) + int(round(x))]
+        if site < 0:
+            return None
+
+        sx, sy = site % self.width, site // self.width
+        d = utils.distance((x, y), (sx, sy))
+        nx, ny = (sx - x) / d, (sy - y) / d
+
+        # Point on the wall, then move the center of the large circle away
+        # from the wall into the plate.
+        wx, wy = sx - 0.5*nx, sy - 0.5*ny
+        big_r = const.PLATE_TANGENT_CIRCLE_RADIUS
+        return (wx - big_r*nx, wy - big_r*ny, -big_r)
+
+    def clipped_area(self, x, y, r):
+        ''' Area of the part of the circle with center (x, y) and radius r that
+        is inside the plate.'''
+        if self.wall_distance(x, y) >= r:
+            return math.pi * r**2
+
+        if self._circle is not None:
+            cx, cy, wall_radius = self._circle
+            return utils.circle_intersection_area(utils.distance((x, y), (cx, cy)), r, wall_radius)
+
+        area = 0
+        r_squared = r*r
+        for py in range(max(0, int(y - r)), min(self.height, int(y + r) + 1)):
+            for px in range(max(0, int(x - r)), min(self.width, int(x + r) + 1)):
+                if self.inside[self.width*py + px] and utils.distance_squared((x, y), (px, py)) <= r_squared:
+                    area += 1
+
+        return float(area)
+
+    def _get_circle_mask(self, cx, cy, r):
+        ''' The pixels of each row inside the disk are a single span, so they are set at once.'''
+        inside = bytearray(self.width * self.height)
+        for y in range(max(0, int(cy - r)), min(self.height, int(cy + r) + 1)):
+            dy_squared = (y - cy)**2
+            if dy_squared > r*r:
+                continue
+
+            half_width = math.sqrt(r*r - dy_squared)
+            x_start = max(0, int(math.ceil(cx - half_width)))
+            x_end = min(self.width, int(math.floor(cx + half_width)) + 1)
+            if x_start < x_end:
+                inside[self.width*y + x_start:self.width*y + x_end] = b'\x01' * (x_end - x_start)
+
+        self._clear_canvas_edges(inside)
+        return inside
+
+    def _get_outline_mask(self, outline_pxls):
+        inside = bytearray(self.width * self.height)
+        for i in range(len(inside)):
+            if outline_pxls[i] == const.BLACK_RGB:
+                inside[i] = 1
+
+        self._clear_canvas_edges(inside)
+        return inside
+
+    def _clear_canvas_edges(self, inside):
+        ''' Keep the pixels at the edges of the canvas outside of the plate so
+        that every pixel inside the plate has a pixel outside of it nearby.'''
+        w, h = self.width, self.height
+        for x in range(w):
+            inside[x] = 0
+            inside[w*(h - 1) + x] = 0
+
+        for y in range(h):
+            inside[w*y] = 0
+            inside[w*y + w - 1] = 0
+
+    def _set_bounds(self):
+        self.area = 0
+        self.x_start, self.y_start = self.width, self.height
+        self.x_end, self.y_end = 0, 0
+
+        for y in range(self.height):
+            row = self.inside[self.width*y:self.width*(y + 1)]
+            count = row.count(b'\x01')
+            if count == 0:
+                continue
+
+            self.area += count
+            self.y_start = min(self.y_start, y)
+            self.y_end = y + 1
+            self.x_start = min(self.x_start, row.index(b'\x01'))
+            self.x_end = max(self.x_end, row.rindex(b'\x01') + 1)
+
+    def _get_row_runs(self, y):
+        ''' Return the runs of pixels inside the plate in row y, as (start, end) with end exclusive.'''
+        row = self.inside[self.width*y:self.width*(y + 1)]
+        runs = []
+        start = row.find(b'\x01')
+        while start >= 0:
+            end = row.find(b'\x00', start)
+            if end < 0:
+                end = self.width
+            runs.append((start, end))
+            start = row.find(b'\x01', end)
+
+        return runs
+
+    def _get_wall_pixels(self):
+        '''
+        Return the location of each pixel inside the plate with a pixel outside
+        of it among its 8 neighbours. A pixel is away from the wall if it and
+        its left and right neighbours are inside the plate in its row and in
+        the rows above and below it, so the runs of each row are shrunk by one
+        pixel and intersected with those of the rows around it. The pixels of
+        the runs of a row outside of this intersection are on the wall. This
+        takes a few steps per run instead of per pixel.
+        '''
+        w = self.width
+        shrunk = [[(start + 1, end - 1) for start, end in self._get_row_runs(y) if end - start > 2]
+                  for y in range(self.height)]
+
+        wall_pixels = []
+        for y in range(self.y_start, self.y_end):
+            interior = _intersect_runs(_intersect_runs(shrunk[y - 1], shrunk[y]), shrunk[y + 1])
+            for start, end in _subtract_runs(self._get_row_runs(y), interior):
+                wall_pixels.extend(range(w*y + start, w*y + end))
+
+        return wall_pixels
+
+    def _get_nearest_sites(self):
+        '''
+        For each pixel inside the plate that is at most max_dist away from
+        the wall, find the nearest pixel outside the plate. This spreads the
+        nearest outside pixel from the pixels along the wall to their
+        neighbours, and stops once the pixels are farther than max_dist.
+
+        Return Value:
+            sites: array[int] := Location of the nearest outside pixel, or -1.
+        '''
+        w = self.width
+        inside = self.inside
+        sites = array('i', [-1]) * (w * self.height)
+        # Squared distance between each pixel and its nearest outside pixel so far.
+        dists = array('i', [0]) * (w * self.height)
+        max_dist_squared = (self.max_dist + 1)**2
+        neighbours = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1)]
+        queue = collections.deque()
+
+        for loc in self._get_wall_pixels():
+            for dx, dy in neighbours:
+                loc2 = loc + w*dy + dx
+                if not inside[loc2]:
+                    sites[loc] = loc2
+                    dists[loc] = dx*dx + dy*dy
+                    queue.append(loc)
+                    break
+
+        while queue:
+            loc = queue.popleft()
+            site = sites[loc]
+            x, y = loc % w - site % w, loc // w - site // w
+
+            for dx, dy in neighbours:
+                loc2 = loc + w*dy + dx
+                if not inside[loc2]:
+                    continue
+
+                d_squared = (x + dx)**2 + (y + dy)**2
+                if d_squared > max_dist_squared:
+                    continue
+
+                if sites[loc2] < 0 or d_squared < dists[loc2]:
+                    sites[loc2] = site
+                    dists[loc2] = d_squared
+                    queue.append(loc2)
+
+        return sites
+
+
+def _intersect_runs(runs1, runs2):
+    ''' Return the runs covered by both of the sorted, disjoint runs1 and runs2.'''
+    result = []
+    i = j = 0
+    while i < len(runs1) and j < len(runs2):
+        start = max(runs1[i][0], runs2[j][0])
+        end = min(runs1[i][1], runs2[j][1])
+        if start < end:
+            result.append((start, end))
+
+        if runs1[i][1] < runs2[j][1]:
+            i += 1
+        else:
+            j += 1
+
+    return result
+
+
+def _subtract_runs(runs, holes):
+    ''' Return the parts of the sorted, disjoint runs not covered by the sorted, disjoint holes.'''
+    result = []
+    j = 0
+    for start, end in runs:
+        while j < len(holes) and holes[j][1] <= start:
+            j += 1
+
+        k = j
+        while k < len(holes) and holes[k][0] < end:
+            if start < holes[k][0]:
+                result.append((start, holes[k][0]))
+            start = max(start, holes[k][1])
+            k += 1
+
+        if start < end:
+            result.append((start, end))
+
+    return result
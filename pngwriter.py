@@ -0,0 +1,88 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = '\x89PNG\r\n\x1a\n'
+
+# Number of compressed bytes written in each IDAT chunk of a PNG file.
+PNG_IDAT_CHUNK_SIZE = 65536
+
+
+class PNGWriter:
+    '''
+    Writes an 8-bit RGB PNG file one row at a time. The rows are compressed
+    as they are written and the compressed data is written out in IDAT chunks
+    of PNG_IDAT_CHUNK_SIZE bytes, so neither the whole raw image nor the whole
+    compressed image is held in memory.
+
+    Attributes:
+        width: int
+        height: int
+        rows_written: int
+    '''
+
+    def __init__(self, path, width, height, level=6):
+        '''
+        Parameters:
+            path: str
+            width: int
+            height: int
+            level: int := zlib compression level, from 1 (fastest) to 9 (smallest).
+        '''
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(level)
+        self._pending = []
+        self._pending_size = 0
+
+        self._out = open(path, 'wb')
+        self._out.write(PNG_SIGNATURE)
+        # Bit depth 8, color type 2 (RGB), default compression, filter and interlace.
+        self._write_chunk('IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+    def write_row(self, row):
+        '''
+        Write the next row of the image.
+
+        Parameters:
+            row: bytearray | str := The red, green and blue bytes of each pixel
+                                    of the row, 3*width bytes in all.
+        '''
+        # Each row starts with its filter type, 0 (None).
+        self._add(self._compressor.compress('\x00' + str(row)))
+        self.rows_written += 1
+
+    def close(self):
+        ''' Write the rest of the compressed data and the end of the file.'''
+        if self.rows_written != self.height:
+            raise ValueError('{} rows were written to a PNG image of height {}.'.format(
+                self.rows_written, self.height))
+
+        self._add(self._compressor.flush())
+        self._write_idat()
+        self._write_chunk('IEND', '')
+        self._out.close()
+
+    def _add(self, data):
+        if not data:
+            return
+
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= PNG_IDAT_CHUNK_SIZE:
+            self._write_idat()
+
+    def _write_idat(self):
+        data = ''.join(self._pending)
+        for i in range(0, len(data), PNG_IDAT_CHUNK_SIZE):
+            self._write_chunk('IDAT', data[i:i + PNG_IDAT_CHUNK_SIZE])
+
+        self._pending = []
+        self._pending_size = 0
+
+    def _write_chunk(self, kind, data):
+        self._out.write(struct.pack('>I', len(data)))
+        self._out.write(kind)
+        self._out.write(data)
+        self._out.write(struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
@@ -0,0 +1,185 @@
+import json
+import os
+import sys
+import threading
+
+import utils
+
+# Output formats of a SamplingProfiler and the suffix of their files.
+PROFILE_FORMATS = {
+    'collapsed': '-profile.txt',
+    'speedscope': '-profile.speedscope.json',
+}
+
+# Modules whose frames are the innermost frame of a waiting thread.
+WAITING_FILES = set(['threading.py', 'Queue.py', 'queue.py'])
+
+# The source files of the program, see SamplingProfiler.hot_lines().
+SOURCE_FILES = set([file_name for file_name in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+                    if file_name.endswith('.py')])
+
+
+class SamplingProfiler:
+    '''
+    A low-overhead profiler that samples the stack of every running thread at
+    a fixed interval on a background thread, instead of tracing every call.
+    The number of samples of a line is roughly proportional to the time spent
+    on it, so the hot lines of a run show up without slowing the run much.
+
+    The samples can be saved in the collapsed stack format (one line per
+    stack, read by flamegraph.pl and most flame graph tools) or in the
+    speedscope format (https://www.speedscope.app).
+
+    Attributes:
+        interval: float := Number of seconds between two samples.
+        sample_count: int := Number of times the threads were sampled.
+    '''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.sample_count = 0
+        self._counts = {} # (thread name, stack) -> number of samples
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_threads)
+        self._sampler.setDaemon(True)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+
+    def _sample_threads(self):
+        own_id = threading.current_thread().ident
+        while True:
+            self._stopped.wait(self.interval)
+            if self._stopped.is_set():
+                return
+
+            names = dict([(thread.ident, thread.name) for thread in threading.enumerate()])
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+                    frame = frame.f_back
+                stack.reverse()
+
+                key = (names.get(thread_id, 'Thread-{}'.format(thread_id)), tuple(stack))
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+            self.sample_count += 1
+
+    def collapsed(self):
+        '''
+        Return the samples in the collapsed stack format: each line has the
+        frames of a stack from the thread down to the sampled line, separated
+        by semicolons, then the number of samples of that stack.
+        '''
+        lines = []
+        for (thread_name, stack), count in self._counts.items():
+            frames = [thread_name] + [_frame_name(frame) for frame in stack]
+            lines.append('{} {}'.format(';'.join(frames), count))
+
+        return sorted(lines)
+
+    def speedscope(self, name):
+        ''' Return the samples as a speedscope file, with a profile per thread.'''
+        frames = []
+        frame_indices = {}
+        profiles = {}
+
+        for (thread_name, stack), count in sorted(self._counts.items(), key=lambda item: item[0][0]):
+            samples = []
+            for frame in stack:
+                if frame not in frame_indices:
+                    frame_indices[frame] = len(frames)
+                    frames.append({'name': _frame_name(frame), 'file': frame[1], 'line': frame[2]})
+                samples.append(frame_indices[frame])
+
+            profile = profiles.setdefault(thread_name, {
+                'type': 'sampled', 'name': '{} ({})'.format(name, thread_name), 'unit': 'seconds',
+                'startValue': 0, 'endValue': 0, 'samples': [], 'weights': []})
+            profile['samples'].append(samples)
+            profile['weights'].append(count * self.interval)
+            profile['endValue'] += count * self.interval
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'gbipg',
+            'shared': {'frames': frames},
+            'profiles': [profiles[thread_name] for thread_name in sorted(profiles)],
+        }
+
+    def hot_lines(self, top=10):
+        '''
+        Return the top lines of the program that the most samples were taken
+        on, as (line, ratio of the samples) pairs, over every thread. A sample
+        taken in a library module counts for the line of the program that
+        called into it, and samples of threads that are waiting on a lock or
+        a queue (e.g. the SnapshotWriter) are left out.
+        '''
+        counts = {}
+        total = 0
+        for (_, stack), count in self._counts.items():
+            if stack and stack[-1][1] in WAITING_FILES:
+                continue
+
+            own_frames = [frame for frame in stack if frame[1] in SOURCE_FILES]
+            if own_frames:
+                line = _frame_name(own_frames[-1])
+                counts[line] = counts.get(line, 0) + count
+                total += count
+
+        lines = sorted(counts.items(), key=lambda item: -item[1])[:top]
+        return [(line, float(count) / total) for line, count in lines]
+
+    def save(self, path, fmt, name):
+        out = open(path, 'w')
+        if fmt == 'collapsed':
+            out.write('\n'.join(self.collapsed()) + '\n')
+        else:
+            json.dump(self.speedscope(name), out)
+        out.close()
+
+
+def _frame_name(frame):
+    return '{} ({}:{})'.format(*frame)
+
+
+def run_profiled(run, ModelConst, file_name, suffix=''):
+    '''
+    Call run() and return what it returns. If the profile.enabled parameter is
+    set, run() is sampled by a SamplingProfiler, whose hottest lines are printed
+    and whose samples are saved next to the output images, in a file named
+    after file_name (see PROFILE_FORMATS).
+
+    Parameters:
+        run: function
+        ModelConst: GBIPG_CONST | MC_CONST
+        file_name: str := Name of the input image that run() generates a plate for.
+        suffix: str := Added to the name of the profile file before the suffix
+                       of its format, e.g. '-mc'.
+    '''
+    if not ModelConst.PROFILE_ENABLED:
+        return run()
+
+    profiler = SamplingProfiler(ModelConst.PROFILE_INTERVAL)
+    profiler.start()
+    try:
+        return run()
+    finally:
+        profiler.stop()
+
+        print('Profile of {}: {} samples. Hottest lines:'.format(file_name, profiler.sample_count))
+        for line, ratio in profiler.hot_lines():
+            print('    {:5.1f}% {}'.format(100 * ratio, line))
+
+        profile_name = utils.output_file_name(file_name, suffix + PROFILE_FORMATS[ModelConst.PROFILE_FORMAT])
+        profiler.save(savePath(profile_name), ModelConst.PROFILE_FORMAT, file_name)
+        print('Saved profile to {}.'.format(profile_name))
@@ -0,0 +1,351 @@
+import math
+import time
+
+from pngwriter import PNGWriter
+import const
+
+# Number of steps per pixel that the centers and the radii of the circles are
+# rounded to by circle_spans(), so that circles of about the same size share
+# their spans.
+RASTER_SUBPIXELS = 4
+
+# (radius, x offset, y offset) -> spans, see circle_spans().
+_spans_cache = {}
+
+
+def circle_spans(x, y, r):
+    '''
+    Return the spans of an antialiased filled circle, relative to the pixel
+    that holds its center. Each row of the circle is one span of the pixels
+    fully inside of the circle, with the pixels on its edge on both sides.
+    The spans only depend on the radius and on where the center is inside of
+    its pixel, both rounded to 1/RASTER_SUBPIXELS of a pixel, so they are
+    computed once and shared by every circle that has the same ones.
+
+    Parameters:
+        x: float
+        y: float
+        r: float
+
+    Return Value:
+        (px, py, spans): tuple[int, int, list[tuple]] := The pixel that holds
+                         the center, and (dy, start, end, edges) of each row,
+                         where the pixels px + start to px + end - 1 of row
+                         py + dy are inside of the circle, and edges holds
+                         (dx, coverage) of each pixel on its edge (see draw_circle()).
+    '''
+    px, py, key = _round_circle(x, y, r)
+    return px, py, _get_cached_spans(key)
+
+
+def _round_circle(x, y, r):
+    ''' Return the pixel that holds the center of a circle, and its key in _spans_cache.'''
+    px, fx = divmod(int(round(x * RASTER_SUBPIXELS)), RASTER_SUBPIXELS)
+    py, fy = divmod(int(round(y * RASTER_SUBPIXELS)), RASTER_SUBPIXELS)
+    return px, py, (int(round(r * RASTER_SUBPIXELS)), fx, fy)
+
+
+def _get_cached_spans(key):
+    spans = _spans_cache.get(key)
+    if spans is None:
+        qr, fx, fy = key
+        spans = _get_spans(float(fx) / RASTER_SUBPIXELS, float(fy) / RASTER_SUBPIXELS,
+                           float(qr) / RASTER_SUBPIXELS)
+        _spans_cache[key] = spans
+
+    return spans
+
+
+def _get_spans(x, y, r):
+    outer_sq = (r + 0.5)**2
+    inner_sq = (r - 0.5)**2 if r > 0.5 else -1.0
+
+    spans = []
+    for dy in range(int(math.ceil(y - r - 0.5)), int(math.floor(y + r + 0.5)) + 1):
+        dy_sq = (dy - y)**2
+        if dy_sq >= outer_sq:
+            continue
+
+        half_span = math.sqrt(outer_sq - dy_sq)
+        x_start = int(math.ceil(x - half_span))
+        x_end = int(math.floor(x + half_span)) + 1
+
+        # Pixels whose centers are at least half a pixel inside of the circle.
+        if dy_sq < inner_sq:
+            inner_half_span = math.sqrt(inner_sq - dy_sq)
+            start = max(x_start, int(math.ceil(x - inner_half_span)))
+            end = max(start, min(x_end, int(math.floor(x + inner_half_span)) + 1))
+        else:
+            start = end = x_start
+
+        # Edge pixels on the left and on the right of the span, with how much
+        # of each the circle covers.
+        edges = []
+        for edge_start, edge_end in [(x_start, start), (end, x_end)]:
+            for dx in range(edge_start, edge_end):
+                coverage = r + 0.5 - math.sqrt((dx - x)**2 + dy_sq)
+                if coverage > 0:
+                    edges.append((dx, min(coverage, 1.0)))
+
+        spans.append((dy, start, end, edges))
+
+    return spans
+
+
+def clipped_spans(width, height, x, y, r):
+    '''
+    Yield the spans of a circle (see circle_spans()) that are on an image of
+    the given size, as pixel indices of the image.
+
+    Yields:
+        (start, end, edges): tuple[int, int, list[tuple[int, float]]] := The
+                             pixels start to end - 1 are inside of the circle,
+                             and edges holds (index, coverage) of each pixel
+                             on its edge.
+    '''
+    px, py, spans = circle_spans(x, y, r)
+    for dy, start, end, edges in spans:
+        row_y = py + dy
+        if row_y < 0 or row_y >= height:
+            continue
+
+        row = width*row_y
+        start = row + min(max(px + start, 0), width)
+        end = row + min(max(px + end, 0), width)
+        yield (start, max(start, end),
+               [(row + px + dx, coverage) for dx, coverage in edges if 0 <= px + dx < width])
+
+
+def draw_circles(pxls, width, height, circles, colors):
+    '''
+    Draw antialiased filled circles into a list of pixels, e.g. the pixels of
+    the canvas after loadPixels(). Each row of a circle is drawn as one span:
+    the pixels fully inside of the circle are set all at once, and only the
+    pixels on its edge are blended with what is under them, by how much of
+    the pixel the circle covers.
+
+    Parameters:
+        pxls: list[color]
+        width: int
+        height: int
+        circles: list[tuple] := (x, y, r, ...) of each circle.
+        colors: list[color] := Color of each circle.
+
+    Return Value:
+        None
+    '''
+    for circle, colr in zip(circles, colors):
+        x, y, r = circle[:3]
+        if r > 0:
+            draw_circle(pxls, width, height, x, y, r, colr)
+
+
+def draw_circle(pxls, width, height, x, y, r, colr):
+    ''' Draw one antialiased filled circle, see draw_circles().'''
+    px, py, spans = circle_spans(x, y, r)
+    for dy, start, end, edges in spans:
+        if not 0 <= py + dy < height:
+            continue
+
+        row = width*(py + dy)
+        start, end = max(px + start, 0), min(px + end, width)
+        if start < end:
+            pxls[row + start:row + end] = [colr] * (end - start)
+
+        for dx, coverage in edges:
+            if not 0 <= px + dx < width:
+                continue
+
+            i = row + px + dx
+            if coverage >= 1:
+                pxls[i] = colr
+            else:
+                pxls[i] = blend(pxls[i], colr, coverage)
+
+
+def blend(dst, src, alpha):
+    ''' Return the color src drawn over the color dst with opacity alpha.'''
+    inv_alpha = 1.0 - alpha
+    r = ((src >> 16) & 0xFF)*alpha + ((dst >> 16) & 0xFF)*inv_alpha
+    g = ((src >> 8) & 0xFF)*alpha + ((dst >> 8) & 0xFF)*inv_alpha
+    b = (src & 0xFF)*alpha + (dst & 0xFF)*inv_alpha
+    return color(int(r + 0.5), int(g + 0.5), int(b + 0.5))
+
+
+class RGBImage:
+    '''
+    An image kept in memory as one flat buffer of the red, green and blue
+    bytes of its pixels, row by row, so that a plate can be drawn and saved
+    without the canvas, e.g. on a server without a display. The spans of the
+    circles are filled by assigning slices of the buffer, which is much faster
+    than setting a list of colors pixel by pixel. The spans of each circle
+    size (see circle_spans()) are also kept as offsets into the buffer, so a
+    circle that is fully on the image is drawn without clipping its spans.
+
+    Attributes:
+        width: int
+        height: int
+        data: bytearray
+    '''
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.data = bytearray(3 * width * height)
+        self._spans = {} # key in _spans_cache -> (bounds, spans as offsets into data)
+
+    def clear(self, colr):
+        self.data[:] = _rgb_bytes(colr) * (self.width * self.height)
+
+    def draw_circles(self, circles, colors):
+        ''' Draw antialiased filled circles, see draw_circles().'''
+        data = self.data
+        for circle, colr in zip(circles, colors):
+            x, y, r = circle[:3]
+            if r <= 0:
+                continue
+
+            px, py, key = _round_circle(x, y, r)
+            if key not in self._spans:
+                self._spans[key] = self._get_offset_spans(_get_cached_spans(key))
+            (left, right, top, bottom), spans = self._spans[key]
+
+            if px + left >= 0 and px + right <= self.width and py + top >= 0 and py + bottom <= self.height:
+                base = 3 * (self.width*py + px)
+            else:
+                base = 0
+                spans = [(3*start, 3*end, end - start, _offset_edges(0, edges))
+                         for start, end, edges in clipped_spans(self.width, self.height, x, y, r)]
+
+            rgb = _rgb_bytes(colr)
+            red, green, blue = rgb
+            for start, end, count, edges in spans:
+                if count > 0:
+                    data[base + start:base + end] = rgb * count
+
+                for i, alpha, inv_alpha in edges:
+                    i += base
+                    data[i] = (red*alpha + data[i]*inv_alpha + 128) >> 8
+                    data[i + 1] = (green*alpha + data[i + 1]*inv_alpha + 128) >> 8
+                    data[i + 2] = (blue*alpha + data[i + 2]*inv_alpha + 128) >> 8
+
+    def _get_offset_spans(self, spans):
+        '''
+        Return the bounds of the given spans, as (left, right, top, bottom) pixel
+        offsets from the center pixel, and the spans as (start, end, count, edges)
+        offsets into data from the first byte of the center pixel. The coverage
+        of the edge pixels is turned into a fixed-point alpha, see _offset_edges().
+        '''
+        offset_spans = []
+        left = right = top = bottom = 0
+        for dy, start, end, edges in spans:
+            row = 3 * self.width*dy
+            offset_spans.append((row + 3*start, row + 3*end, end - start,
+                                 _offset_edges(row, edges)))
+
+            columns = [start, end] + [dx for dx, _ in edges] + [dx + 1 for dx, _ in edges]
+            left, right = min([left] + columns), max([right] + columns)
+            top, bottom = min(top, dy), max(bottom, dy + 1)
+
+        return (left, right, top, bottom), offset_spans
+
+    def get(self, x, y):
+        ''' Return the color of a pixel.'''
+        i = 3 * (self.width*y + x)
+        return color(self.data[i], self.data[i + 1], self.data[i + 2])
+
+    def save(self, path):
+        ''' Save the image as a PNG file, see pngwriter.PNGWriter.'''
+        writer = PNGWriter(path, self.width, self.height)
+        stride = 3 * self.width
+        for y in range(self.height):
+            writer.write_row(self.data[stride*y:stride*(y + 1)])
+        writer.close()
+
+
+class BlankPixels:
+    ''' The pixels of an input image with no figure, indexed like PImage.pixels but never stored.'''
+
+    def __init__(self, size):
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, loc):
+        return const.WHITE_RGB
+
+
+def _offset_edges(row, edges):
+    '''
+    Return (offset, alpha, inv_alpha) of each (x, coverage) edge pixel, where
+    offset is the first byte of the pixel in RGBImage.data after row, and alpha
+    is its coverage in 1/256ths, so that the pixels are blended with integers.
+    '''
+    offset_edges = []
+    for x, coverage in edges:
+        alpha = int(round(coverage * 256))
+        offset_edges.append((row + 3*x, alpha, 256 - alpha))
+
+    return offset_edges
+
+
+def _rgb_bytes(colr):
+    return bytearray([(colr >> 16) & 0xFF, (colr >> 8) & 0xFF, colr & 0xFF])
+
+
+class CircleRenderer:
+    '''
+    Collects the circles to be drawn on the canvas and draws them together
+    with draw_circles(), so the canvas pixels are loaded and updated once per
+    batch instead of once per circle.
+
+    If image is given, the circles are drawn into it instead of the canvas, so
+    that plates can be generated without the canvas, e.g. several at the same
+    time on different threads (see benchmark.py).
+
+    Attributes:
+        width: int
+        height: int
+        image: RGBImage | None
+        seconds_per_circle: float := How long the last flush took per circle.
+    '''
+
+    def __init__(self, width, height, image=None):
+        self.width = width
+        self.height = height
+        self.image = image
+        self.seconds_per_circle = 0.0
+        self._circles = []
+        self._colors = []
+
+    def clear(self, colr):
+        ''' Fill the canvas or image with colr.'''
+        if self.image is None:
+            background(colr)
+        else:
+            self.image.clear(colr)
+
+    def add(self, x, y, r, colr):
+        self._circles.append((x, y, r))
+        self._colors.append(colr)
+
+    def flush(self):
+        ''' Draw every circle added since the last flush on the canvas.'''
+        if not self._circles:
+            return
+
+        start_time = time.time()
+        if self.image is None:
+            loadPixels()
+            draw_circles(pixels, self.width, self.height, self._circles, self._colors)
+            updatePixels()
+        else:
+            self.image.draw_circles(self._circles, self._colors)
+        self.seconds_per_circle = (time.time() - start_time) / len(self._circles)
+        self._circles = []
+        self._colors = []
+
+    def flush_time(self):
+        ''' Estimate how many seconds flush() would take, from how long the last flush took.'''
+        return self.seconds_per_circle * len(self._circles)
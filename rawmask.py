@@ -0,0 +1,128 @@
+import struct
+
+from java.io import RandomAccessFile
+from java.nio.channels import FileChannel
+
+import const
+
+# Header of a raw mask file: magic, bits per pixel (1 or 8), padding, width
+# and height. The rows of the mask follow the header, top to bottom. With 1
+# bit per pixel, each row is padded to a whole byte and the leftmost pixel is
+# the most significant bit. A set bit or a non-zero byte is a figure pixel.
+RAW_MASK_MAGIC = b'GBMASK'
+RAW_MASK_HEADER = '>6sBBII'
+RAW_MASK_HEADER_SIZE = struct.calcsize(RAW_MASK_HEADER)
+
+
+class RawMask:
+    '''
+    A pre-binarized mask file that is memory-mapped instead of being decoded
+    into a list of pixels. It can be used in place of the PImage of the input
+    image: pixels returns the color of a pixel and codes its mask code, both
+    read from the mapped file on access.
+
+    Attributes:
+        width: int
+        height: int
+        bits: int := 1 or 8.
+        pixels: RawMaskPixels
+        codes: RawMaskCodes
+    '''
+
+    def __init__(self, path):
+        self._file = RandomAccessFile(path, 'r')
+        channel = self._file.getChannel()
+        self._buffer = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size())
+
+        header = bytearray(RAW_MASK_HEADER_SIZE)
+        for i in range(RAW_MASK_HEADER_SIZE):
+            header[i] = self._buffer.get(i) & 0xFF
+
+        magic, self.bits, _, self.width, self.height = struct.unpack(RAW_MASK_HEADER, bytes(header))
+        if magic != RAW_MASK_MAGIC or self.bits not in [1, 8]:
+            raise ValueError('{} is not a raw mask file.'.format(path))
+
+        if self.bits == 1:
+            self._row_size = (self.width + 7) // 8
+        else:
+            self._row_size = self.width
+
+        self.pixels = RawMaskPixels(self)
+        self.codes = RawMaskCodes(self)
+
+    def loadPixels(self):
+        pass
+
+    def in_fig(self, loc):
+        ''' Returns True if the pixel at location loc is a figure pixel.'''
+        y, x = divmod(loc, self.width)
+        if self.bits == 1:
+            byte = self._buffer.get(RAW_MASK_HEADER_SIZE + self._row_size*y + x // 8)
+            return (byte >> (7 - x % 8)) & 1 == 1
+
+        return self._buffer.get(RAW_MASK_HEADER_SIZE + self._row_size*y + x) != 0
+
+    def close(self):
+        ''' Close the file. The pixels can still be read, from the mapping of the file.'''
+        self._file.close()
+
+
+class RawMaskPixels:
+    ''' Colors of the pixels of a RawMask, indexed like PImage.pixels.'''
+
+    def __init__(self, raw_mask):
+        self._raw_mask = raw_mask
+
+    def __len__(self):
+        return self._raw_mask.width * self._raw_mask.height
+
+    def __getitem__(self, loc):
+        return const.BLACK_RGB if self._raw_mask.in_fig(loc) else const.WHITE_RGB
+
+
+class RawMaskCodes:
+    ''' Mask codes of the pixels of a RawMask, see mask.MaskPyramid.'''
+
+    def __init__(self, raw_mask):
+        self._raw_mask = raw_mask
+
+    def __len__(self):
+        return self._raw_mask.width * self._raw_mask.height
+
+    def __getitem__(self, loc):
+        return const.MASK_FIG_CODE if self._raw_mask.in_fig(loc) else const.MASK_BG_CODE
+
+
+def write_raw_mask(path, pxls, width, height, bits=1):
+    '''
+    Write the pixels of a black-and-white image as a raw mask file. Black
+    pixels are figure pixels.
+
+    Parameters:
+        path: str
+        pxls: list[color]
+        width: int
+        height: int
+        bits: int := 1 or 8 bits per pixel.
+
+    Return Value:
+        None
+    '''
+    out = open(path, 'wb')
+    out.write(struct.pack(RAW_MASK_HEADER, RAW_MASK_MAGIC, bits, 0, width, height))
+
+    for y in range(height):
+        if bits == 1:
+            row = bytearray((width + 7) // 8)
+            for x in range(width):
+                if pxls[width*y + x] == const.BLACK_RGB:
+                    row[x // 8] |= 0x80 >> (x % 8)
+        else:
+            row = bytearray(width)
+            for x in range(width):
+                if pxls[width*y + x] == const.BLACK_RGB:
+                    row[x] = 1
+
+        out.write(bytes(row))
+
+    out.close()
@@ -0,0 +1,51 @@
+import threading
+import time
+import Queue
+
+
+class SnapshotWriter:
+    '''
+    Saves copies of the canvas as image files on a background thread so that
+    encoding the PNG files does not stall the generation loop.
+
+    Attributes:
+        interval: float := Minimum number of seconds between two throttled
+                           snapshots (see is_due()). 0 disables them.
+        saved: int := Number of snapshots queued so far.
+    '''
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.saved = 0
+        self._last_time = time.time()
+        self._queue = Queue.Queue()
+        self._worker = threading.Thread(target=self._encode_frames)
+        self._worker.setDaemon(True)
+        self._worker.start()
+
+    def save(self, file_name):
+        '''Queue a copy of the current canvas to be saved as file_name.'''
+        self._queue.put((get(), savePath(file_name)))
+        self._last_time = time.time()
+        self.saved += 1
+
+    def is_due(self):
+        '''
+        Returns True if a throttled snapshot should be saved now, i.e. if at
+        least interval seconds have passed since the last snapshot.
+        '''
+        return self.interval > 0 and time.time() - self._last_time >= self.interval
+
+    def close(self):
+        '''Wait until all queued snapshots are saved and stop the worker.'''
+        self._queue.put(None)
+        self._worker.join()
+
+    def _encode_frames(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            frame, path = item
+            frame.save(path)
@@ -48,145 +48,67 @@ def distance_squared(p1, p2):
     return dx_squared + dy_squared
 
 
-def loc_to_coord(loc, ModelConst):
-    '''Convert a location value to its coordinate form.
+def morton_code(x, y):
+    ''' Interleave the bits of x and y (each less than 2**16), so that points
+    with close Morton codes (Z-order) are close to each other.
 
     Parameters:
-        loc: int
-        ModelConst: GBIPG_CONST | MC_CONST
+        x: int
+        y: int
 
     Return Value:
-        (x, y): tuple[int, int]
+        int
     '''
-    x = loc % ModelConst.WIDTH
-    y = (loc - x) / ModelConst.WIDTH
-    return (x, y)
+    return _spread_bits(int(x)) | (_spread_bits(int(y)) << 1)
 
 
-def nearest_other_colored_pixel(node, pxls):
-    '''
-    Returns the distance between a center point with the nearest pixel with 
-    different color as the center point.
-
-    Parameters:
-        node: Node
-        pxls: list[color]
+def _spread_bits(v):
+    ''' Insert a 0 bit before each of the lower 16 bits of v.'''
+    v &= 0xFFFF
+    v = (v | (v << 8)) & 0x00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+    return v
 
-    Return Value:
-        nearest_dist: float
-    '''
-    nearest_dist = node.max_radius
-    c = node.center
-    cx, cy = c.get_coord()
-    curr_max_radius = node.max_radius
-    opp_colr_points = get_opposite_colr_points_in_circle(
-        c, curr_max_radius, pxls, node._ModelConst)
 
-    for p2_loc in opp_colr_points:
-        p2x, p2y = loc_to_coord(p2_loc, node._ModelConst)
-
-        dist = distance((cx, cy), (p2x, p2y))
-        nearest_dist = min(nearest_dist, dist)
-
-    return nearest_dist
-
-
-def get_opposite_colr_points_in_circle(p, r, canvas_pxls, ModelConst):
-    '''
-    Get all points that are opposite the color of point p within the
-    circle with center point p and radius r.
+def circle_intersection_area(d, r1, r2):
+    ''' Area of the intersection of two circles.
 
     Parameters:
-        p: Point := center point of the circle.
-        r: int := radius of the circle.
-        canvas_pxls: list[color] := color of each pixel in the canvas.
-        ModelConst: GBIPG_CONST | MC_CONST
+        d: float := Distance between the centers of the circles.
+        r1: float
+        r2: float
 
     Return Value:
-        opp_colr_points: list[int] := list of indices (in canvas_pxls) of points
-                                      that have their color opposite to point p.
-    '''
-    opp_colr_points = []
-    px, py = p.get_coord()
-    p_colr = const.BLACK_RGB if p.in_fig() else const.WHITE_RGB
-    r_squared = r*r
-    i = 0
-
-    y_start = ceil(max(0, py - r))
-    x_start = ceil(max(0, px - r))
-    y_end = ceil(min(ModelConst.HEIGHT, py + r + 1))
-    x_end = ceil(min(ModelConst.WIDTH, px + r + 1))
-
-    for p2y in range(y_start, y_end):
-        for p2x in range(x_start, x_end):
-            p2_loc = ModelConst.WIDTH*p2y + p2x
-            if distance_squared((px, py), (p2x, p2y)) <= r_squared and canvas_pxls[p2_loc] != p_colr:
-                opp_colr_points.append(p2_loc)
-
-    return opp_colr_points
-
-
-def opposite_colr_point_in_circle(p, r, canvas_pxls, ModelConst):
-    '''
-    Checks if a point that has its color opposite to point p is 
-    within the circle with center point p and radius r.
-
-    Parameters:
-        p: Point := center point of the circle.
-        r: int := radius of the circle.
-        canvas_pxls: list[color] := color of each pixel in the canvas.
-        ModelConst: GBIPG_CONST | MC_CONST
-
-    Return Value:
-        boolean := Returns True if a point with opposite color to point p 
-                   is within the circle.
+        float
     '''
-    px, py = p.get_coord()
-    p_colr = const.BLACK_RGB if p.in_fig() else const.WHITE_RGB
-    r_squared = r*r
-
-    y_start = ceil(max(0, py - r))
-    x_start = ceil(max(0, px - r))
-    y_end = ceil(min(ModelConst.HEIGHT, py + r + 1))
-    x_end = ceil(min(ModelConst.WIDTH, px + r + 1))
+    if d >= r1 + r2:
+        return 0.0
 
-    for p2y in range(y_start, y_end):
-        for p2x in range(x_start, x_end):
-            p2_loc = ModelConst.WIDTH*p2y + p2x
-            if distance_squared((px, py), (p2x, p2y)) <= r_squared and canvas_pxls[p2_loc] != p_colr:
-                return True
+    if d <= abs(r1 - r2):
+        return math.pi * min(r1, r2)**2
 
-    return False
+    a1 = math.acos((d*d + r1*r1 - r2*r2) / (2.0*d*r1))
+    a2 = math.acos((d*d + r2*r2 - r1*r1) / (2.0*d*r2))
+    triangles = 0.5 * math.sqrt((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2))
+    return r1*r1*a1 + r2*r2*a2 - triangles
 
 
-def other_colr_point_in_circle(p, r, canvas_pxls, ModelConst):
-    '''Returns True if a pixel in the circle has a color other than black or white.
+def output_file_name(file_name, suffix):
+    '''Returns the name of an output file derived from the input image file name.
 
     Parameters:
-        p: Point
-        r: int := radius
-        canvas_pxls: list[color]
-        ModelConst: ModelConst
+        file_name: str := Name of the input PNG file, e.g. 'hand.png'.
+        suffix: str := e.g. '-step1.png'.
 
     Return Value:
-        bool
+        str := e.g. 'hand-step1.png'.
     '''
-    px, py = p.get_coord()
-    p_colr = const.BLACK_RGB if p.in_fig() else const.WHITE_RGB
-    r_squared = r*r
-
-    y_start = ceil(max(0, py - r))
-    x_start = ceil(max(0, px - r))
-    y_end = ceil(min(ModelConst.HEIGHT, py + r + 1))
-    x_end = ceil(min(ModelConst.WIDTH, px + r + 1))
-
-    for p2y in range(y_start, y_end):
-        for p2x in range(x_start, x_end):
-            p2_loc = ModelConst.WIDTH*p2y + p2x
-            if distance_squared((px, py), (p2x, p2y)) <= r_squared and canvas_pxls[p2_loc] not in [const.BLACK_RGB, const.WHITE_RGB]:
-                return True
+    if file_name.endswith('.png'):
+        file_name = file_name[:-len('.png')]
 
-    return False
+    return file_name + suffix
 
 
 def get_rgb(colr):
@@ -221,3 +143,24 @@ def is_color_hex(inp):
             return False
 
     return True
+
+
+def hex_to_color(color_hex):
+    '''Returns the color of a color hex string of the form '#xxxxxx'.'''
+    return color(int(color_hex[1:3], 16), int(color_hex[3:5], 16), int(color_hex[5:7], 16))
+
+
+def color_scheme_entry(entry):
+    '''
+    Returns the (color hex, weight) pair of an entry of a color scheme
+    parameter, which is either a color hex string (weight 1) or a
+    [color hex, weight] pair. Returns None if the entry is malformed.
+    '''
+    if isinstance(entry, basestring):
+        return (entry, 1)
+
+    if isinstance(entry, list) and len(entry) == 2 and isinstance(entry[0], basestring) \
+            and type(entry[1]) in [int, float]:
+        return (entry[0], entry[1])
+
+    return None
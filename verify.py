@@ -0,0 +1,154 @@
+import math
+
+from classes import CircleGrid
+import const
+import utils
+
+# Circles may overlap each other, the wall or the figure boundary by this much
+# (in pixels) to allow for floating-point error.
+VERIFY_TOLERANCE = 1e-6
+
+
+class LayoutReport:
+    '''
+    Result of check_layout(). Each list holds the index (in the checked list of
+    circles) of every circle that breaks the rule, or the pair of indices for
+    overlapping circles.
+
+    Attributes:
+        circle_count: int := Number of circles with a positive radius.
+        overlaps: list[tuple[int, int]]
+        wall_crossings: list[int]
+        boundary_crossings: list[int]
+        fig_circles: int := Number of circles on the figure or an extra figure region.
+    '''
+
+    def __init__(self):
+        self.circle_count = 0
+        self.overlaps = []
+        self.wall_crossings = []
+        self.boundary_crossings = []
+        self.fig_circles = 0
+
+    def is_valid(self):
+        return not (self.overlaps or self.wall_crossings or self.boundary_crossings)
+
+    def summary(self):
+        return '{} circles ({} in figure), {} overlapping pairs, {} crossing the wall, {} crossing the figure boundary.'.format(
+            self.circle_count, self.fig_circles, len(self.overlaps),
+            len(self.wall_crossings), len(self.boundary_crossings))
+
+
+def check_layout(circles, img_pxls, ModelConst, outline_pxls=None, tolerance=VERIFY_TOLERANCE):
+    '''
+    Check that a generated layout is a valid Ishihara Plate: no two circles
+    overlap, every circle stays within the wall, and every circle stays on the
+    side of the figure boundary its center is on. Circles with no radius are
+    ignored. The circles are put in a CircleGrid so each circle is only
+    compared with the circles around it.
+
+    The wall and the figure boundary are checked against the input pixels
+    themselves rather than the Plate and MaskPyramid the circles were placed
+    with, so that a bug in either is caught: the default wall is checked as a
+    disk, and the pixels covered by each circle are read from the outline and
+    the input image.
+
+    Parameters:
+        circles: list[tuple] := (x, y, r, ...) of each circle, e.g. the
+                                circles yielded by gbipg.GBIPG_stream().
+        img_pxls: list[color] := Pixels of the input image.
+        ModelConst: GBIPG_CONST | MC_CONST
+        outline_pxls: list[color] | None := Pixels of the plate outline, see
+                                            img.getOutlinePixels().
+        tolerance: float
+
+    Return Value:
+        report: LayoutReport
+    '''
+    report = LayoutReport()
+    grid = CircleGrid(2*max([c[2] for c in circles] + [1]))
+    # Index in circles of each circle in grid.
+    grid_indices = []
+
+    for indx, circle in enumerate(circles):
+        x, y, r = circle[:3]
+        # Nodes that got no room at all are not drawn.
+        if r <= 0:
+            continue
+
+        for indx2 in grid.query(x, y, r):
+            x2, y2, r2 = grid.circles[indx2]
+            if utils.distance((x, y), (x2, y2)) < r + r2 - tolerance:
+                report.overlaps.append((grid_indices[indx2], indx))
+
+        grid.add(x, y, r)
+        grid_indices.append(indx)
+        report.circle_count += 1
+
+        if _crosses_wall(x, y, r, ModelConst, outline_pxls, tolerance):
+            report.wall_crossings.append(indx)
+
+        code = ModelConst.mask_code(img_pxls[ModelConst.WIDTH*int(round(y)) + int(round(x))])
+        if code not in [const.MASK_BG_CODE, const.MASK_OTHER_CODE]:
+            report.fig_circles += 1
+
+        if _crosses_boundary(x, y, r - tolerance, code, img_pxls, ModelConst):
+            report.boundary_crossings.append(indx)
+
+    return report
+
+
+def _crosses_wall(x, y, r, ModelConst, outline_pxls, tolerance):
+    '''
+    Returns True if the circle crosses the wall. The default wall is the circle
+    of radius WALL_RADIUS at the center of the canvas. The wall of an outline
+    lies halfway between its black pixels and the other pixels, so no pixel
+    within r + 0.5 of the center may be outside the outline or the canvas.
+    '''
+    if outline_pxls is None:
+        center = (ModelConst.WIDTH // 2, ModelConst.HEIGHT // 2)
+        return utils.distance((x, y), center) + r > ModelConst.WALL_RADIUS + tolerance
+
+    for py, x_start, x_end in _circle_rows(x, y, r + 0.5 - tolerance):
+        if py < 0 or py >= ModelConst.HEIGHT or x_start < 0 or x_end > ModelConst.WIDTH:
+            return True
+
+        row = ModelConst.WIDTH*py
+        for loc in range(row + x_start, row + x_end):
+            if outline_pxls[loc] != const.BLACK_RGB:
+                return True
+
+    return False
+
+
+def _crosses_boundary(x, y, r, code, img_pxls, ModelConst):
+    ''' Returns True if a pixel within r of (x, y) has a mask code other than code.'''
+    for py, x_start, x_end in _circle_rows(x, y, r):
+        if py < 0 or py >= ModelConst.HEIGHT:
+            continue
+
+        row = ModelConst.WIDTH*py
+        colors = set([img_pxls[loc] for loc in range(row + max(0, x_start), row + min(ModelConst.WIDTH, x_end))])
+        for colr in colors:
+            if ModelConst.mask_code(colr) != code:
+                return True
+
+    return False
+
+
+def _circle_rows(x, y, r):
+    '''
+    Yield (py, x_start, x_end) for each row py of pixels whose centers are less
+    than r away from (x, y), where x_end is exclusive. The rows are not clipped
+    to the canvas.
+    '''
+    for py in range(int(math.floor(y - r)), int(math.ceil(y + r)) + 1):
+        half_width_squared = r*r - (py - y)**2
+        if half_width_squared <= 0:
+            continue
+
+        half_width = math.sqrt(half_width_squared)
+        x_start = int(math.floor(x - half_width)) + 1
+        x_end = int(math.ceil(x + half_width))
+        if x_start < x_end:
+            yield (py, x_start, x_end)